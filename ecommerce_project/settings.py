@@ -33,6 +33,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "shop.context_processors.catalog",
             ],
         },
     },
@@ -44,6 +45,14 @@ DATABASES = {
         "NAME": BASE_DIR / "db.sqlite3",
     }
 }
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ecommerce",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -68,3 +77,37 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
+RECOMMENDATION_SIMILARITY_BLOCK_SIZE = 256
+RECOMMENDATION_SIMILARITY_DTYPE = "float64"
+RECOMMENDATION_NEIGHBORS = 50
+RECOMMENDATION_TRAINING_MODE = "background"
+RECOMMENDATION_MIN_RETRAIN_INTERVAL = 30.0
+RECOMMENDATION_FULL_REBUILD_INTERVAL = 3600.0
+RECOMMENDATION_SNAPSHOT_DIR = None
+RECOMMENDATION_SNAPSHOT_CHECK_INTERVAL = 5.0
+RECOMMENDATION_SNAPSHOT_ELECT_TRAINER = True
+RECOMMENDATION_SIMILAR_BACKEND = "exact"
+RECOMMENDATION_LSH_TABLES = 16
+RECOMMENDATION_LSH_BITS = 10
+RECOMMENDATION_LSH_MULTIPROBE = True
+RECOMMENDATION_TRAINING_WINDOW_DAYS = None
+RECOMMENDATION_DECAY_HALF_LIFE_DAYS = None
+POPULARITY_CACHE_TTL = 300
+RECOMMENDATION_ELIGIBILITY_TTL = 60.0
+RECOMMENDATION_CACHE_ALIAS = "default"
+RECOMMENDATION_CACHE_TTL = 300
+RECOMMENDATION_ENGINE = "item_knn"
+RECOMMENDATION_ALS_FACTORS = 32
+RECOMMENDATION_ALS_ITERATIONS = 10
+RECOMMENDATION_ALS_REGULARIZATION = 0.1
+RECOMMENDATION_ALS_ALPHA = 10.0
+RECOMMENDATION_ALS_CG_STEPS = 3
+INTERACTION_LOG_MODE = "buffered"
+INTERACTION_LOG_BATCH_SIZE = 200
+INTERACTION_LOG_FLUSH_INTERVAL = 0.5
+INTERACTION_RETENTION_DAYS = 365
+INTERACTION_ARCHIVE_DIR = BASE_DIR / "archive" / "interactions"
+PRODUCT_LIST_PAGE_SIZE = 24
+SEARCH_RANK_CANDIDATES = 2000
+FRAGMENT_CACHE_ALIAS = "default"
+FRAGMENT_CACHE_TTL = 600
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order, OrderItem, UserInteraction
+from .models import (Category, Product, Cart, CartItem, Order, OrderItem, UserInteraction,
+                     UserRecommendation, ProductPopularity, InteractionAggregate, InteractionBaseline)
+from .search import filter_matching
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
@@ -8,13 +10,20 @@ class CategoryAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'price', 'stock', 'created_at']
     list_filter = ['category', 'created_at']
+    list_select_related = ['category']
     search_fields = ['name', 'description']
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'created_at', 'get_total']
+    list_display = ['user', 'item_count', 'total', 'created_at']
+    list_select_related = ['user']
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['cart', 'product', 'quantity', 'get_subtotal']
+    list_select_related = ['cart__user', 'product']
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'status', 'total_amount', 'created_at']
@@ -27,4 +36,18 @@ class OrderItemAdmin(admin.ModelAdmin):
 class UserInteractionAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'interaction_type', 'timestamp']
     list_filter = ['interaction_type', 'timestamp']
+    search_fields = ['user__username', 'product__name']
+@admin.register(UserRecommendation)
+class UserRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'updated_at']
+    search_fields = ['user__username']
+@admin.register(ProductPopularity)
+class ProductPopularityAdmin(admin.ModelAdmin):
+    list_display = ['product', 'day', 'count']
+    list_filter = ['day']
+@admin.register(InteractionAggregate)
+@admin.register(InteractionBaseline)
+class InteractionAggregateAdmin(admin.ModelAdmin):
+    list_display = ['user', 'product', 'view_count', 'like_count', 'dislike_count', 'cart_add_count',
+                    'purchase_count', 'last_seen']
     search_fields = ['user__username', 'product__name']
\ No newline at end of file
@@ -0,0 +1,113 @@
+import heapq
+from collections import Counter
+from itertools import groupby
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Value
+from django.db.models.functions import Greatest
+from .models import InteractionAggregate, InteractionBaseline, UserInteraction
+from .recommendation import EXCLUSIVE_INTERACTIONS as EXCLUSIVE, INTERACTION_WEIGHTS
+COUNT_FIELDS = {interaction_type: f'{interaction_type}_count' for interaction_type in INTERACTION_WEIGHTS}
+def fold(events, current=None):
+    counts = Counter()
+    reset = set()
+    removed = 0.0
+    for interaction_type in events:
+        opposite = EXCLUSIVE.get(interaction_type)
+        if opposite:
+            existing = counts[opposite] + (0 if opposite in reset else (current or {}).get(opposite, 0))
+            removed += existing * INTERACTION_WEIGHTS[opposite]
+            reset.add(opposite)
+            counts[opposite] = 0
+        counts[interaction_type] += 1
+    return counts, reset, removed
+def _current_exclusive_counts(pairs, model=InteractionAggregate):
+    if not pairs:
+        return {}
+    query = Q()
+    for user_id, product_id in pairs:
+        query |= Q(user_id=user_id, product_id=product_id)
+    rows = model.objects.filter(query).values_list(
+        'user_id', 'product_id', 'like_count', 'dislike_count'
+    )
+    return {(user_id, product_id): {'like': likes, 'dislike': dislikes}
+            for user_id, product_id, likes, dislikes in rows}
+def record(interactions, model=InteractionAggregate):
+    events = {}
+    for interaction in interactions:
+        events.setdefault((interaction.user_id, interaction.product_id), []).append(interaction)
+    current = _current_exclusive_counts([
+        pair for pair, pair_events in events.items()
+        if any(interaction.interaction_type in EXCLUSIVE for interaction in pair_events)
+    ], model)
+    removed_weights = {}
+    for (user_id, product_id), pair_events in events.items():
+        counts, reset, removed = fold(
+            [interaction.interaction_type for interaction in pair_events], current.get((user_id, product_id))
+        )
+        last_seen = max(interaction.timestamp for interaction in pair_events)
+        values = {COUNT_FIELDS[interaction_type]: Value(counts[interaction_type]) for interaction_type in reset}
+        values.update({
+            COUNT_FIELDS[interaction_type]: F(COUNT_FIELDS[interaction_type]) + count
+            for interaction_type, count in counts.items() if interaction_type not in reset
+        })
+        aggregate = model.objects.filter(user_id=user_id, product_id=product_id)
+        if not aggregate.update(last_seen=Greatest('last_seen', Value(last_seen)), **values):
+            try:
+                with transaction.atomic():
+                    model.objects.create(
+                        user_id=user_id, product_id=product_id, last_seen=last_seen,
+                        **{COUNT_FIELDS[interaction_type]: count for interaction_type, count in counts.items()}
+                    )
+            except IntegrityError:
+                aggregate.update(last_seen=Greatest('last_seen', Value(last_seen)), **values)
+        if removed:
+            removed_weights[user_id, product_id] = removed
+    return removed_weights
+def remove(interaction):
+    field = COUNT_FIELDS.get(interaction.interaction_type)
+    if field:
+        InteractionAggregate.objects.filter(user_id=interaction.user_id, product_id=interaction.product_id).update(
+            **{field: Greatest(F(field) - 1, 0)}
+        )
+def _pair(row):
+    return row['user_id'], row['product_id']
+def _combined(counts, baseline):
+    for (user_id, product_id), rows in groupby(heapq.merge(counts, baseline, key=_pair), key=_pair):
+        rows = list(rows)
+        yield InteractionAggregate(
+            user_id=user_id, product_id=product_id, last_seen=max(row['last_seen'] for row in rows),
+            **{field: sum(row[field] for row in rows) for field in COUNT_FIELDS.values()}
+        )
+def rebuild(batch_size=1000):
+    # pruned events survive only in the baseline, so the rebuild starts from it
+    with transaction.atomic():
+        InteractionAggregate.objects.all().delete()
+        counts = UserInteraction.objects.order_by('user_id', 'product_id').values('user_id', 'product_id').annotate(
+            last_seen=Max('timestamp'),
+            **{field: Count('id', filter=Q(interaction_type=interaction_type))
+               for interaction_type, field in COUNT_FIELDS.items()}
+        )
+        baseline = InteractionBaseline.objects.order_by('user_id', 'product_id').values(
+            'user_id', 'product_id', 'last_seen', *COUNT_FIELDS.values()
+        )
+        InteractionAggregate.objects.bulk_create(
+            _combined(counts.iterator(), baseline.iterator()), batch_size=batch_size
+        )
+        conflicted = InteractionAggregate.objects.filter(
+            user_id=OuterRef('user_id'), product_id=OuterRef('product_id'), like_count__gt=0, dislike_count__gt=0
+        )
+        toggles = UserInteraction.objects.filter(Exists(conflicted), interaction_type__in=EXCLUSIVE).order_by(
+            'user_id', 'product_id', 'timestamp', 'id'
+        ).values_list('user_id', 'product_id', 'interaction_type')
+        for (user_id, product_id), rows in groupby(toggles.iterator(), key=lambda row: row[:2]):
+            pruned = _current_exclusive_counts([(user_id, product_id)], InteractionBaseline).get(
+                (user_id, product_id), {}
+            )
+            folded, reset, _ = fold([interaction_type for _, _, interaction_type in rows], pruned)
+            InteractionAggregate.objects.filter(user_id=user_id, product_id=product_id).update(**{
+                COUNT_FIELDS[interaction_type]: folded[interaction_type] + (
+                    0 if interaction_type in reset else pruned.get(interaction_type, 0)
+                )
+                for interaction_type in EXCLUSIVE
+            })
+        return InteractionAggregate.objects.count()
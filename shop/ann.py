@@ -0,0 +1,101 @@
+import numpy as np
+from . import recommendation_cython
+from .similarity import normalize_columns
+from .sparse import CSRMatrix
+class LSHIndex:
+    def __init__(self, item_vectors, codes, orders, sorted_codes, n_bits, multiprobe=True, seed=0):
+        self.item_vectors = item_vectors
+        self.n_bits = n_bits
+        self.multiprobe = multiprobe
+        self.seed = seed
+        self.codes = codes
+        self.orders = orders
+        self.sorted_codes = sorted_codes
+    @classmethod
+    def build(cls, user_item_matrix, n_tables=8, n_bits=16, multiprobe=True, seed=0):
+        n_users, n_items = user_item_matrix.shape
+        normalized, _ = normalize_columns(user_item_matrix, np.float32)
+        item_vectors = normalized.transpose()
+        rng = np.random.default_rng(seed)
+        weights = np.left_shift(np.uint64(1), np.arange(n_bits, dtype=np.uint64))
+        codes = np.zeros((n_tables, n_items), dtype=np.uint64)
+        for table in range(n_tables):
+            planes = rng.standard_normal((n_users, n_bits), dtype=np.float32)
+            projections = recommendation_cython.csr_dense_matmul(
+                item_vectors.indptr,
+                item_vectors.indices,
+                item_vectors.data,
+                planes,
+                np.zeros((n_items, n_bits), dtype=np.float32)
+            )
+            codes[table] = ((projections > 0) * weights).sum(axis=1, dtype=np.uint64)
+        orders = np.argsort(codes, axis=1, kind='stable')
+        sorted_codes = np.take_along_axis(codes, orders, axis=1)
+        return cls(item_vectors, codes, orders, sorted_codes, n_bits, multiprobe, seed)
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        item_vectors = CSRMatrix(arrays['ann_indptr'], arrays['ann_indices'], arrays['ann_data'], meta['shape'])
+        return cls(item_vectors, arrays['ann_codes'], arrays['ann_orders'], arrays['ann_sorted_codes'],
+                   meta['n_bits'], meta['multiprobe'], meta['seed'])
+    def arrays(self):
+        vectors = self.item_vectors
+        return {
+            'ann_indptr': vectors.indptr,
+            'ann_indices': vectors.indices,
+            'ann_data': vectors.data,
+            'ann_codes': self.codes,
+            'ann_orders': self.orders,
+            'ann_sorted_codes': self.sorted_codes,
+        }
+    def meta(self):
+        # the hyperplanes are redrawn from the seed; stored codes already cover every item
+        return {
+            'shape': list(self.item_vectors.shape),
+            'n_bits': self.n_bits,
+            'multiprobe': self.multiprobe,
+            'seed': self.seed,
+        }
+    @property
+    def nbytes(self):
+        vectors = self.item_vectors
+        return (vectors.indptr.nbytes + vectors.indices.nbytes + vectors.data.nbytes
+                + self.codes.nbytes + self.orders.nbytes + self.sorted_codes.nbytes)
+    def candidates(self, item_idx):
+        buckets = []
+        flips = np.left_shift(np.uint64(1), np.arange(self.n_bits if self.multiprobe else 0, dtype=np.uint64))
+        for table in range(len(self.codes)):
+            code = self.codes[table, item_idx]
+            probes = np.concatenate([[code], np.bitwise_xor(code, flips)])
+            starts = np.searchsorted(self.sorted_codes[table], probes, side='left')
+            stops = np.searchsorted(self.sorted_codes[table], probes, side='right')
+            for start, stop in zip(starts, stops):
+                buckets.append(self.orders[table, start:stop])
+        candidates = np.unique(np.concatenate(buckets)) if buckets else np.empty(0, dtype=np.int64)
+        return candidates[candidates != item_idx]
+    def similarities(self, item_idx, candidates):
+        vectors = self.item_vectors
+        query = np.zeros(vectors.shape[1], dtype=np.float32)
+        indices, data = vectors.row_slice(item_idx)
+        query[indices] = data
+        starts = vectors.indptr[candidates]
+        counts = vectors.indptr[candidates + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + offsets
+        products = vectors.data[positions] * query[vectors.indices[positions]]
+        return np.bincount(np.repeat(np.arange(len(candidates)), counts), weights=products,
+                           minlength=len(candidates))
+    def _top(self, item_idx, candidates, n):
+        if not len(candidates):
+            return candidates, np.empty(0)
+        scores = self.similarities(item_idx, candidates)
+        top = np.argsort(-scores, kind='stable')[:n]
+        top = top[scores[top] > 0]
+        return candidates[top], scores[top]
+    def query(self, item_idx, n=10, eligible=None):
+        candidates = self.candidates(item_idx)
+        if eligible is not None:
+            candidates = candidates[eligible[candidates]]
+        return self._top(item_idx, candidates, n)
+    def exact_query(self, item_idx, n=10):
+        candidates = np.arange(self.item_vectors.shape[0])
+        return self._top(item_idx, candidates[candidates != item_idx], n)
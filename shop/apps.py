@@ -1,4 +1,6 @@
 from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "shop"
\ No newline at end of file
+    name = "shop"
+    def ready(self):
+        from . import signals
@@ -0,0 +1,181 @@
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from .models import Category, InteractionAggregate, Product
+from .neighbors import NeighborIndex
+from .recommendation import RecommendationEngine
+from .similarity import compute_similarity_matrix
+from .synthetic import INTERACTION_TYPES, generate_interactions
+SCALES = {
+    'small': {'products': 1000, 'users': 5000, 'interactions': 100000},
+    'medium': {'products': 10000, 'users': 50000, 'interactions': 1000000},
+    'large': {'products': 100000, 'users': 500000, 'interactions': 10000000},
+}
+DENSE_SIMILARITY_LIMIT = 20000
+class SyntheticEngine(RecommendationEngine):
+    def __init__(self, first_user_id):
+        super().__init__()
+        self.snapshot_dir = None
+        self.training_window_days = None
+        self.decay_half_life_days = None
+        self.first_user_id = first_user_id
+    def interaction_aggregates(self):
+        return super().interaction_aggregates().filter(user_id__gte=self.first_user_id)
+    def _get_cached_products(self, key, params):
+        return None
+    def _set_cached_products(self, key, params, products):
+        pass
+def measure(func, repeat=3):
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return result, {
+        'seconds': min(timings),
+        'median_seconds': statistics.median(timings),
+        'peak_bytes': peak,
+    }
+def per_call(stats, calls):
+    stats['calls'] = calls
+    stats['ms_per_call'] = stats['seconds'] * 1000 / max(calls, 1)
+    return stats
+def insert_aggregates(user_ids, product_ids, type_idx, batch_size=5000):
+    keys, counts = np.unique(
+        np.rec.fromarrays([user_ids, product_ids, type_idx], names='user,product,type'),
+        return_counts=True
+    )
+    pairs, inverse = np.unique(keys[['user', 'product']], return_inverse=True)
+    columns = np.zeros((len(pairs), len(INTERACTION_TYPES)), dtype=np.int64)
+    columns[inverse, keys['type']] = counts
+    last_seen = datetime.now(timezone.utc)
+    InteractionAggregate.objects.bulk_create(
+        (InteractionAggregate(user_id=user_id, product_id=product_id, last_seen=last_seen,
+                              **{f'{value}_count': count for value, count in zip(INTERACTION_TYPES, row)})
+         for user_id, product_id, row in zip(pairs['user'].tolist(), pairs['product'].tolist(), columns.tolist())),
+        batch_size=batch_size
+    )
+def run_scale(name, products, users, interactions, seed=0, queries=100, repeat=3):
+    user_idx, product_idx, type_idx, _ = generate_interactions(users, products, interactions, seed=seed)
+    stages = {}
+    with transaction.atomic():
+        category = Category.objects.create(name=f'Benchmark {name}')
+        Product.objects.bulk_create(
+            (Product(name=f'Benchmark product {i}', description='', price=10, category=category, stock=10)
+             for i in range(products)),
+            batch_size=5000
+        )
+        product_ids = np.fromiter(
+            category.products.order_by('id').values_list('id', flat=True).iterator(),
+            dtype=np.int64
+        )
+        first_user_id = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        User.objects.bulk_create(
+            (User(id=first_user_id + i, username=f'benchmark-{name}-{first_user_id + i}', password='!')
+             for i in range(users)),
+            batch_size=5000
+        )
+        insert_aggregates(user_idx + first_user_id, product_ids[product_idx], type_idx)
+        engine = SyntheticEngine(first_user_id)
+        _, stages['read_interactions'] = measure(engine._read_interactions, repeat)
+        model, stages['build_user_item_matrix'] = measure(engine.build_user_item_matrix, repeat)
+        matrix = model.user_item_matrix
+        if products <= DENSE_SIMILARITY_LIMIT:
+            _, stages['compute_similarity_matrix'] = measure(
+                lambda: compute_similarity_matrix(matrix, engine.similarity_block_size, engine.similarity_dtype),
+                repeat
+            )
+        else:
+            stages['compute_similarity_matrix'] = {'skipped': f'dense matrix exceeds {DENSE_SIMILARITY_LIMIT} products'}
+        model.neighbor_index, stages['neighbor_index'] = measure(
+            lambda: NeighborIndex.build(
+                matrix,
+                n_neighbors=engine.n_neighbors,
+                block_size=engine.similarity_block_size,
+                dtype=engine.similarity_dtype
+            ),
+            repeat
+        )
+        engine.model = model
+        rng = np.random.default_rng(seed)
+        sample_users = rng.choice(len(model.user_ids), size=min(queries, len(model.user_ids)), replace=False)
+        sample_products = rng.choice(len(product_ids), size=min(queries, len(product_ids)), replace=False)
+        ratings = model.user_rows(sample_users)
+        _, stats = measure(lambda: model.neighbor_index.predict_scores(ratings, k=10), repeat)
+        stages['predict_scores'] = per_call(stats, len(sample_users))
+        sample_user_objects = [User(id=int(user_id)) for user_id in model.user_ids[sample_users]]
+        _, stats = measure(
+            lambda: [engine.get_recommendations(user, n_recommendations=10) for user in sample_user_objects],
+            repeat
+        )
+        stages['get_recommendations'] = per_call(stats, len(sample_user_objects))
+        sample_product_objects = list(
+            Product.objects.filter(id__in=product_ids[sample_products].tolist()).select_related('category')
+        )
+        _, stats = measure(
+            lambda: [engine.get_similar_products(product, n_similar=5) for product in sample_product_objects],
+            repeat
+        )
+        stages['get_similar_products'] = per_call(stats, len(sample_product_objects))
+        transaction.set_rollback(True)
+    return {
+        'scale': name,
+        'products': products,
+        'users': users,
+        'interactions': interactions,
+        'nnz': int(matrix.nnz),
+        'stages': stages,
+    }
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+def run_benchmarks(scales, seed=0, queries=100, repeat=3):
+    return {
+        'commit': current_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': [run_scale(name, seed=seed, queries=queries, repeat=repeat, **params)
+                    for name, params in scales],
+    }
+def compare(results, baseline, tolerance=0.25):
+    previous = {
+        (row['scale'], row['interactions'], stage): stats.get('seconds')
+        for row in baseline['results']
+        for stage, stats in row['stages'].items()
+    }
+    rows = []
+    for row in results['results']:
+        for stage, stats in row['stages'].items():
+            before = previous.get((row['scale'], row['interactions'], stage))
+            after = stats.get('seconds')
+            if not before or after is None:
+                continue
+            ratio = after / before
+            rows.append((row['scale'], stage, before, after, ratio, ratio > 1 + tolerance))
+    return rows
@@ -0,0 +1,23 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+GENERATION_KEY = 'catalog:generation'
+def fragment_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+def catalog_generation():
+    cache = fragment_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+def bump_catalog_generation():
+    cache = fragment_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+def catalog_changed():
+    bump_catalog_generation()
+    transaction.on_commit(bump_catalog_generation)
@@ -0,0 +1,48 @@
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from .catalog import catalog_changed
+from .interaction_log import interaction_logger
+from .models import Cart, CartItem, Order, OrderItem, Product
+from .recommendation import recommendation_engine
+class CheckoutError(Exception):
+    pass
+def _per_product(quantities):
+    return Case(*[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()])
+def place_order(cart, shipping_address):
+    with transaction.atomic():
+        quantities = dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+        if not quantities:
+            raise CheckoutError('Your cart is empty.')
+        products = list(Product.objects.select_for_update().filter(id__in=quantities).order_by('id'))
+        for product in products:
+            if product.stock < quantities[product.id]:
+                raise CheckoutError(f'Insufficient stock for {product.name}.')
+        updated = Product.objects.filter(id__in=quantities, stock__gte=_per_product(quantities)).update(
+            stock=F('stock') - _per_product(quantities), updated_at=timezone.now()
+        )
+        if updated < len(products):
+            raise CheckoutError('Some items sold out while you were checking out.')
+        order = Order.objects.create(
+            user_id=cart.user_id,
+            total_amount=sum(product.price * quantities[product.id] for product in products),
+            shipping_address=shipping_address
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantities[product.id], price=product.price)
+            for product in products
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(CartItem._meta.db_table)} WHERE cart_id = %s', [cart.pk]
+            )
+        Cart.objects.filter(pk=cart.pk).update(item_count=0, total=Decimal('0.00'))
+        stock = dict(Product.objects.filter(id__in=quantities).values_list('id', 'stock'))
+        def publish_stock():
+            for product_id, remaining in stock.items():
+                recommendation_engine.update_stock(product_id, remaining)
+        transaction.on_commit(publish_stock)
+        catalog_changed()
+        interaction_logger.log_many([(cart.user_id, product.id, 'purchase') for product in products])
+    return order
@@ -0,0 +1,8 @@
+from django.conf import settings
+from .catalog import catalog_generation
+def catalog(request):
+    return {
+        'catalog_generation': catalog_generation(),
+        'fragment_cache_alias': getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default'),
+        'fragment_cache_ttl': getattr(settings, 'FRAGMENT_CACHE_TTL', 600),
+    }
@@ -0,0 +1,140 @@
+import numpy as np
+from django.conf import settings
+from . import recommendation_cython
+from .metrics import TRAIN_STAGE_SECONDS
+from .recommendation import RecommendationEngine, RecommendationModel, top_n_indices
+def solve_factors(matrix, fixed, current, regularization, alpha, cg_steps=3, max_elements=1 << 22):
+    n_rows = matrix.shape[0]
+    k = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(k)
+    confidence = alpha * matrix.data
+    rows = np.repeat(np.arange(n_rows), np.diff(matrix.indptr))
+    chunk = max(1, max_elements // k)
+    def weighted_sum(weights):
+        return recommendation_cython.csr_dense_matmul(
+            matrix.indptr, matrix.indices, weights, fixed, np.zeros((n_rows, k))
+        )
+    def apply(x):
+        dots = np.empty(len(rows))
+        for start in range(0, len(rows), chunk):
+            stop = start + chunk
+            dots[start:stop] = np.einsum('ij,ij->i', fixed[matrix.indices[start:stop]], x[rows[start:stop]])
+        return x @ gram + weighted_sum(confidence * dots)
+    x = current.copy()
+    residual = weighted_sum(1.0 + confidence) - apply(x)
+    direction = residual.copy()
+    norms = (residual * residual).sum(axis=1)
+    for _ in range(cg_steps):
+        product = apply(direction)
+        curvature = (direction * product).sum(axis=1)
+        step = np.divide(norms, curvature, out=np.zeros_like(norms), where=curvature > 0)
+        x += step[:, None] * direction
+        residual -= step[:, None] * product
+        new_norms = (residual * residual).sum(axis=1)
+        beta = np.divide(new_norms, norms, out=np.zeros_like(norms), where=norms > 0)
+        direction = residual + beta[:, None] * direction
+        norms = new_norms
+    return x
+def fold_in(item_factors, gram, indices, data, regularization, alpha):
+    vectors = item_factors[indices].astype(np.float64)
+    confidence = alpha * data
+    lhs = gram + (vectors * confidence[:, None]).T @ vectors + regularization * np.eye(len(gram))
+    return np.linalg.solve(lhs, vectors.T @ (1.0 + confidence)).astype(item_factors.dtype)
+def fit_als(user_item_matrix, n_factors=32, iterations=10, regularization=0.1, alpha=10.0, cg_steps=3,
+            seed=0, dtype=np.float32):
+    n_users, n_items = user_item_matrix.shape
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(scale=1.0 / np.sqrt(n_factors), size=(n_items, n_factors))
+    user_factors = np.zeros((n_users, n_factors))
+    item_major = user_item_matrix.transpose()
+    for _ in range(iterations):
+        user_factors = solve_factors(
+            user_item_matrix, item_factors, user_factors, regularization, alpha, cg_steps
+        )
+        item_factors = solve_factors(
+            item_major, user_factors, item_factors, regularization, alpha, cg_steps
+        )
+    return user_factors.astype(dtype), item_factors.astype(dtype)
+class FactorizationModel(RecommendationModel):
+    kind = 'factors'
+    def __init__(self, user_ids, product_ids, user_item_matrix, user_factors=None, item_factors=None,
+                 regularization=0.1, alpha=10.0, **kwargs):
+        super().__init__(user_ids, product_ids, user_item_matrix, **kwargs)
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.user_factor_overrides = {}
+        self._item_norms = None
+        self._gram = None
+    @property
+    def is_empty(self):
+        return self.item_factors is None
+    def index_arrays(self):
+        return {'user_factors': self.user_factors, 'item_factors': self.item_factors}
+    def index_meta(self):
+        return {'regularization': self.regularization, 'alpha': self.alpha}
+    def user_vectors(self, user_indices):
+        user_indices = np.atleast_1d(np.asarray(user_indices, dtype=np.int64))
+        vectors = np.zeros((len(user_indices), self.item_factors.shape[1]), dtype=self.item_factors.dtype)
+        in_base = user_indices < len(self.user_factors)
+        vectors[in_base] = self.user_factors[user_indices[in_base]]
+        for position, user_idx in enumerate(user_indices.tolist()):
+            override = self.user_factor_overrides.get(user_idx)
+            if override is not None:
+                vectors[position] = override
+        return vectors
+    def predict_scores(self, user_indices, user_ratings):
+        scores = (self.user_vectors(user_indices) @ self.item_factors.T).astype(np.float64)
+        return scores if np.ndim(user_indices) else scores[0]
+    def similar_items(self, product_idx, n):
+        if self._item_norms is None:
+            self._item_norms = np.linalg.norm(self.item_factors, axis=1)
+        norms = self._item_norms
+        denominator = norms * norms[product_idx]
+        scores = np.divide(self.item_factors @ self.item_factors[product_idx], denominator,
+                           out=np.zeros(len(norms)), where=denominator > 0)
+        scores[product_idx] = -np.inf
+        scores[~self.eligible] = -np.inf
+        top = top_n_indices(scores, n)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+    def update_index(self, user_idx, product_idx, old, new):
+        if self._gram is None:
+            self._gram = self.item_factors.T.astype(np.float64) @ self.item_factors
+        indices, data = self.sparse_row(user_idx)
+        rated = data > 0
+        self.user_factor_overrides[user_idx] = fold_in(
+            self.item_factors, self._gram, indices[rated], data[rated], self.regularization, self.alpha
+        )
+class FactorizationEngine(RecommendationEngine):
+    def __init__(self):
+        super().__init__()
+        self.similar_backend = 'exact'
+        self.n_factors = getattr(settings, 'RECOMMENDATION_ALS_FACTORS', 32)
+        self.iterations = getattr(settings, 'RECOMMENDATION_ALS_ITERATIONS', 10)
+        self.regularization = getattr(settings, 'RECOMMENDATION_ALS_REGULARIZATION', 0.1)
+        self.alpha = getattr(settings, 'RECOMMENDATION_ALS_ALPHA', 10.0)
+        self.cg_steps = getattr(settings, 'RECOMMENDATION_ALS_CG_STEPS', 3)
+    def build_model(self):
+        base = self.build_user_item_matrix()
+        model = FactorizationModel(
+            base.user_ids,
+            base.product_ids,
+            base.user_item_matrix,
+            regularization=self.regularization,
+            alpha=self.alpha,
+            built_at=base.built_at,
+            eligible=base.eligible
+        )
+        if model.user_item_matrix.nnz:
+            with TRAIN_STAGE_SECONDS.time(stage='factors'):
+                model.user_factors, model.item_factors = fit_als(
+                    model.user_item_matrix,
+                    n_factors=self.n_factors,
+                    iterations=self.iterations,
+                    regularization=self.regularization,
+                    alpha=self.alpha,
+                    cg_steps=self.cg_steps
+                )
+        return model
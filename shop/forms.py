@@ -0,0 +1,25 @@
+from django import forms
+from django.utils.http import urlencode
+class ProductFilterForm(forms.Form):
+    category = forms.IntegerField(required=False, min_value=1)
+    min_price = forms.DecimalField(required=False, min_value=0, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, decimal_places=2)
+    after = forms.IntegerField(required=False, min_value=1)
+    before = forms.IntegerField(required=False, min_value=1)
+    def filter(self, queryset):
+        filters = {
+            'category_id': self.cleaned_data.get('category'),
+            'price__gte': self.cleaned_data.get('min_price'),
+            'price__lte': self.cleaned_data.get('max_price'),
+        }
+        return queryset.filter(**{key: value for key, value in filters.items() if value is not None})
+    def query_string(self, **cursor):
+        params = {
+            name: self.cleaned_data[name] for name in ('category', 'min_price', 'max_price')
+            if self.cleaned_data.get(name) is not None
+        }
+        params.update(cursor)
+        return urlencode(params)
+class SearchForm(forms.Form):
+    q = forms.CharField(required=False, max_length=200)
+    page = forms.IntegerField(required=False, min_value=1)
@@ -0,0 +1,96 @@
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from .models import UserInteraction
+from .signals import record_interactions
+logger = logging.getLogger(__name__)
+class InteractionLogger:
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+    @property
+    def mode(self):
+        return getattr(settings, 'INTERACTION_LOG_MODE', 'buffered')
+    @property
+    def batch_size(self):
+        return getattr(settings, 'INTERACTION_LOG_BATCH_SIZE', 200)
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'INTERACTION_LOG_FLUSH_INTERVAL', 0.5)
+    @property
+    def pending(self):
+        return len(self._pending)
+    def log(self, user_id, product_id, interaction_type):
+        interaction = UserInteraction(user_id=user_id, product_id=product_id, interaction_type=interaction_type)
+        if self.mode == 'sync':
+            interaction.save()
+            return
+        self._enqueue([interaction])
+    def log_many(self, events):
+        interactions = [
+            UserInteraction(user_id=user_id, product_id=product_id, interaction_type=interaction_type)
+            for user_id, product_id, interaction_type in events
+        ]
+        if self.mode == 'sync':
+            with transaction.atomic():
+                record_interactions(UserInteraction.objects.bulk_create(interactions))
+            return
+        self._enqueue(interactions)
+    def _enqueue(self, interactions):
+        with self._lock:
+            self._pending.extend(interactions)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        self._ensure_started()
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with transaction.atomic():
+                    record_interactions(UserInteraction.objects.bulk_create(batch))
+            except IntegrityError:
+                batch = self._save_individually(batch)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            return len(batch)
+    def _save_individually(self, batch):
+        saved = []
+        for interaction in batch:
+            try:
+                with transaction.atomic():
+                    interaction.pk = None
+                    interaction.save()
+                saved.append(interaction)
+            except IntegrityError:
+                logger.warning('Dropping interaction for missing user %s or product %s',
+                               interaction.user_id, interaction.product_id)
+        return saved
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='interaction-logger', daemon=True)
+                self._thread.start()
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered interactions failed')
+            finally:
+                close_old_connections()
+interaction_logger = InteractionLogger()
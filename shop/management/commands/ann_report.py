@@ -0,0 +1,86 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shop.ann import LSHIndex
+from shop.recommendation import RecommendationEngine
+import numpy as np
+class Command(BaseCommand):
+    help = 'Compare recall and latency of the LSH similar-products backend against exact search'
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', default='8,16,32',
+                            help='Comma-separated numbers of hash tables to try')
+        parser.add_argument('--bits', default='8,10,12',
+                            help='Comma-separated numbers of bits per table to try')
+        parser.add_argument('--n', type=int, default=10, help='Neighbors per query')
+        parser.add_argument('--sample', type=int, default=200, help='Number of query products')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Emit results as JSON')
+    def handle(self, *args, **options):
+        model = RecommendationEngine().build_user_item_matrix()
+        matrix = model.user_item_matrix
+        if not matrix.nnz:
+            raise CommandError('No interactions found.')
+        n = options['n']
+        rng = np.random.default_rng(options['seed'])
+        rated = np.nonzero(np.bincount(matrix.indices, minlength=matrix.shape[1]))[0]
+        queries = rng.choice(rated, size=min(options['sample'], len(rated)), replace=False)
+        baseline = LSHIndex.build(matrix, n_tables=1, n_bits=1)
+        started = time.perf_counter()
+        truth = [set(baseline.exact_query(item, n)[0].tolist()) for item in queries]
+        exact_latency = (time.perf_counter() - started) / len(queries)
+        results = [{
+            'backend': 'exact',
+            'tables': None,
+            'bits': None,
+            'multiprobe': None,
+            'build_seconds': 0.0,
+            'query_ms': exact_latency * 1000,
+            'recall': 1.0,
+            'index_bytes': 0,
+        }]
+        configs = [
+            (int(n_tables), int(n_bits), multiprobe)
+            for n_tables in options['tables'].split(',')
+            for n_bits in options['bits'].split(',')
+            for multiprobe in (False, True)
+        ]
+        for n_tables, n_bits, multiprobe in configs:
+            started = time.perf_counter()
+            index = LSHIndex.build(matrix, n_tables=n_tables, n_bits=n_bits,
+                                   multiprobe=multiprobe, seed=options['seed'])
+            build_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            found = [set(index.query(item, n)[0].tolist()) for item in queries]
+            latency = (time.perf_counter() - started) / len(queries)
+            hits = sum(len(f & t) for f, t in zip(found, truth))
+            results.append({
+                'backend': 'lsh',
+                'tables': n_tables,
+                'bits': n_bits,
+                'multiprobe': multiprobe,
+                'build_seconds': build_seconds,
+                'query_ms': latency * 1000,
+                'recall': hits / max(sum(len(t) for t in truth), 1),
+                'index_bytes': index.nbytes,
+            })
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'products': matrix.shape[1],
+                'users': matrix.shape[0],
+                'interactions': matrix.nnz,
+                'queries': len(queries),
+                'n': n,
+                'results': results,
+            }, indent=2))
+            return
+        self.stdout.write(f'{matrix.shape[1]} products, {matrix.shape[0]} users, '
+                          f'{len(queries)} queries, recall@{n}')
+        self.stdout.write(
+            f'{"backend":<8}{"tables":>8}{"bits":>6}{"probe":>7}{"build s":>10}{"query ms":>10}{"recall":>8}'
+        )
+        for row in results:
+            probe = '-' if row['multiprobe'] is None else ('yes' if row['multiprobe'] else 'no')
+            self.stdout.write(
+                f'{row["backend"]:<8}{row["tables"] or "-":>8}{row["bits"] or "-":>6}{probe:>7}'
+                f'{row["build_seconds"]:>10.3f}{row["query_ms"]:>10.3f}{row["recall"]:>8.3f}'
+            )
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from shop.benchmarks import SCALES, compare, run_benchmarks
+class Command(BaseCommand):
+    help = 'Benchmark the recommendation engine on synthetic power-law datasets'
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='small',
+                            help=f'Comma-separated scales to run ({", ".join(SCALES)})')
+        parser.add_argument('--products', type=int, help='Run a custom scale with this many products')
+        parser.add_argument('--users', type=int, default=None)
+        parser.add_argument('--interactions', type=int, default=None)
+        parser.add_argument('--queries', type=int, default=100,
+                            help='Users and products sampled for the per-request stages')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (best is reported)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--json', action='store_true', help='Emit results as JSON')
+        parser.add_argument('--baseline', help='JSON results from an earlier run to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown against the baseline before failing')
+    def handle(self, *args, **options):
+        if options['products']:
+            scales = [('custom', {
+                'products': options['products'],
+                'users': options['users'] or options['products'] * 5,
+                'interactions': options['interactions'] or options['products'] * 100,
+            })]
+        else:
+            names = [name.strip() for name in options['scales'].split(',') if name.strip()]
+            unknown = [name for name in names if name not in SCALES]
+            if unknown:
+                raise CommandError(f'Unknown scale(s): {", ".join(unknown)}')
+            scales = [(name, SCALES[name]) for name in names]
+        results = run_benchmarks(scales, seed=options['seed'], queries=options['queries'],
+                                 repeat=options['repeat'])
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for row in results['results']:
+                self.stdout.write(f'{row["scale"]}: {row["products"]} products, {row["users"]} users, '
+                                  f'{row["interactions"]} interactions ({row["nnz"]} non-zero)')
+                self.stdout.write(f'  {"stage":<28}{"seconds":>10}{"ms/call":>10}{"peak MB":>10}')
+                for stage, stats in row['stages'].items():
+                    if 'skipped' in stats:
+                        self.stdout.write(f'  {stage:<28}{"skipped":>10}')
+                        continue
+                    ms = f'{stats["ms_per_call"]:.3f}' if 'ms_per_call' in stats else '-'
+                    self.stdout.write(f'  {stage:<28}{stats["seconds"]:>10.3f}{ms:>10}'
+                                      f'{stats["peak_bytes"] / 2 ** 20:>10.1f}')
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+            rows = compare(results, baseline, options['tolerance'])
+            for scale, stage, before, after, ratio, regressed in rows:
+                self.stderr.write(f'{scale} {stage}: {before:.3f}s -> {after:.3f}s ({ratio:.2f}x)'
+                                  f'{" REGRESSION" if regressed else ""}')
+            regressions = [row for row in rows if row[5]]
+            if regressions:
+                raise CommandError(f'{len(regressions)} stage(s) slower than the baseline '
+                                   f'by more than {options["tolerance"]:.0%}')
@@ -1,9 +1,40 @@
+from datetime import datetime, timezone
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from shop.models import Category, Product
+from django.db import connection, transaction
+from django.db.models import Max
+from shop.models import Category, Order, OrderItem, Product, ProductPopularity, UserInteraction
+from shop.aggregation import rebuild as rebuild_aggregates
+from shop.catalog import bump_catalog_generation
+from shop.popularity import popularity_store
+from shop.synthetic import INTERACTION_TYPES, generate_interactions
+import numpy as np
 import random
+import time
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_MIX = [0.05, 0.05, 0.1, 0.75, 0.05]
+def insert_rows(model, columns, rows, batch_size):
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(model._meta.get_field(name).column) for name in columns),
+        ', '.join(['%s'] * len(columns))
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
 class Command(BaseCommand):
     help = 'Populate database with sample data'
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Synthetic users to add')
+        parser.add_argument('--products', type=int, default=0, help='Synthetic products to add')
+        parser.add_argument('--categories', type=int, default=0, help='Synthetic categories to add')
+        parser.add_argument('--interactions', type=int, default=0, help='Synthetic interactions to add')
+        parser.add_argument('--orders', type=int, default=0, help='Synthetic orders to add')
+        parser.add_argument('--days', type=int, default=90, help='Days of history to spread rows over')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
     def handle(self, *args, **kwargs):
         self.stdout.write('Populating database with sample data...')
         if not User.objects.filter(username='admin').exists():
@@ -73,4 +104,137 @@ class Command(BaseCommand):
             )
             if created:
                 self.stdout.write(f'Created product: {product.name}')
-        self.stdout.write(self.style.SUCCESS('Successfully populated database!'))
\ No newline at end of file
+        if any(kwargs.get(name) for name in ['users', 'products', 'categories', 'interactions', 'orders']):
+            self.populate_synthetic(**kwargs)
+            bump_catalog_generation()
+        self.stdout.write(self.style.SUCCESS('Successfully populated database!'))
+    def timestamps(self, rng, size, days):
+        now = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'us')
+        return now - (days * 86400e6 * rng.random(size) ** 2).astype('timedelta64[us]')
+    def as_db_values(self, timestamps):
+        return np.char.replace(np.datetime_as_string(timestamps, unit='us'), 'T', ' ').tolist()
+    def add_popularity(self, product_ids, timestamps, batch_size):
+        keys, counts = np.unique(
+            np.rec.fromarrays([product_ids, timestamps.astype('datetime64[D]')], names='product,day'),
+            return_counts=True
+        )
+        days = keys['day'].astype(object).tolist()
+        existing = dict(
+            ((product_id, day), counter_id)
+            for counter_id, product_id, day in ProductPopularity.objects.filter(day__gte=min(days)).values_list(
+                'id', 'product_id', 'day'
+            ).iterator()
+        )
+        updates = []
+        inserts = []
+        for product_id, day, count in zip(keys['product'].tolist(), days, counts.tolist()):
+            counter_id = existing.get((product_id, day))
+            if counter_id is None:
+                inserts.append((product_id, day.isoformat(), count))
+            else:
+                updates.append((count, counter_id))
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.executemany('UPDATE {0} SET {1} = {1} + %s WHERE {2} = %s'.format(
+                quote(ProductPopularity._meta.db_table), quote('count'), quote('id')
+            ), updates)
+        insert_rows(ProductPopularity, ['product', 'day', 'count'], inserts, batch_size)
+        popularity_store.clear()
+    def populate_synthetic(self, users=0, products=0, categories=0, interactions=0, orders=0, days=90,
+                           seed=0, batch_size=10000, **kwargs):
+        rng = np.random.default_rng(seed)
+        started = time.perf_counter()
+        with transaction.atomic():
+            offset = Category.objects.count()
+            Category.objects.bulk_create(
+                (Category(name=f'Category {offset + i + 1}') for i in range(categories)),
+                batch_size=batch_size
+            )
+            if categories:
+                self.stdout.write(f'Created {categories} categories')
+            if users:
+                offset = User.objects.aggregate(last=Max('id'))['last'] or 0
+                password = make_password('user123')
+                User.objects.bulk_create(
+                    (User(username=f'shopper{offset + i + 1}', email=f'shopper{offset + i + 1}@example.com',
+                          password=password) for i in range(users)),
+                    batch_size=batch_size
+                )
+                self.stdout.write(f'Created {users} users (password: user123)')
+            if products:
+                category_ids = list(Category.objects.values_list('id', flat=True))
+                offset = Product.objects.count()
+                prices = np.round(rng.lognormal(3.5, 0.8, products), 2).clip(0.99, 9999.99)
+                stocks = np.where(rng.random(products) < 0.05, 0, rng.integers(1, 200, products))
+                choices = rng.integers(len(category_ids), size=products)
+                Product.objects.bulk_create(
+                    (Product(
+                        name=f'Product {offset + i + 1}',
+                        description=f'Synthetic product {offset + i + 1}',
+                        price=f'{price:.2f}',
+                        stock=stock,
+                        category_id=category_ids[choice]
+                    ) for i, (price, stock, choice) in enumerate(zip(
+                        prices.tolist(), stocks.tolist(), choices.tolist()
+                    ))),
+                    batch_size=batch_size
+                )
+                self.stdout.write(f'Created {products} products')
+        catalog = np.fromiter(
+            Product.objects.order_by('id').values_list('id', 'category_id', 'price').iterator(),
+            dtype=[('id', np.int64), ('category', np.int64), ('price', np.float64)]
+        )
+        user_ids = np.fromiter(User.objects.order_by('id').values_list('id', flat=True).iterator(), dtype=np.int64)
+        if not len(catalog) or not len(user_ids):
+            return
+        _, clusters = np.unique(catalog['category'], return_inverse=True)
+        if interactions:
+            with transaction.atomic():
+                user_idx, product_idx, type_idx, _ = generate_interactions(
+                    len(user_ids), len(catalog), interactions, seed=seed, product_clusters=clusters
+                )
+                timestamps = self.timestamps(rng, interactions, days)
+                insert_rows(UserInteraction, ['user', 'product', 'interaction_type', 'timestamp'], list(zip(
+                    user_ids[user_idx].tolist(),
+                    catalog['id'][product_idx].tolist(),
+                    [INTERACTION_TYPES[i] for i in type_idx.tolist()],
+                    self.as_db_values(timestamps)
+                )), batch_size)
+                self.add_popularity(catalog['id'][product_idx], timestamps, batch_size)
+                rebuild_aggregates(batch_size)
+            self.stdout.write(f'Created {interactions} interactions')
+        if orders:
+            with transaction.atomic():
+                sizes = rng.geometric(0.6, size=orders)
+                user_idx, product_idx, _, _ = generate_interactions(
+                    len(user_ids), len(catalog), int(sizes.sum()), seed=seed + 1, product_clusters=clusters
+                )
+                quantities = rng.geometric(0.7, size=len(product_idx))
+                first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+                order_of_item = np.repeat(np.arange(orders), sizes)
+                totals = np.bincount(order_of_item, weights=catalog['price'][product_idx] * quantities,
+                                     minlength=orders)
+                first_id = (Order.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+                order_ids = first_id + np.arange(orders)
+                created = self.as_db_values(self.timestamps(rng, orders, days))
+                statuses = rng.choice(len(ORDER_STATUSES), size=orders, p=ORDER_STATUS_MIX)
+                insert_rows(Order, [
+                    'id', 'user', 'status', 'total_amount', 'shipping_address', 'created_at', 'updated_at'
+                ], list(zip(
+                    order_ids.tolist(),
+                    user_ids[user_idx[first]].tolist(),
+                    [ORDER_STATUSES[i] for i in statuses.tolist()],
+                    [f'{total:.2f}' for total in totals.tolist()],
+                    ['123 Synthetic Street'] * orders,
+                    created,
+                    created
+                )), batch_size)
+                insert_rows(OrderItem, ['order', 'product', 'quantity', 'price'], list(zip(
+                    order_ids[order_of_item].tolist(),
+                    catalog['id'][product_idx].tolist(),
+                    quantities.tolist(),
+                    [f'{price:.2f}' for price in catalog['price'][product_idx].tolist()]
+                )), batch_size)
+            self.stdout.write(f'Created {orders} orders with {len(product_idx)} items')
+        self.stdout.write(f'Synthetic data generated in {time.perf_counter() - started:.1f}s. '
+                          'Run train_recommendations or precompute_recommendations to refresh the model.')
\ No newline at end of file
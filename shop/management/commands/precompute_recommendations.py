@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from shop.models import UserRecommendation
+from shop.recommendation import create_engine
+import numpy as np
+class Command(BaseCommand):
+    help = 'Precompute top-N product recommendations for all active users'
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=20,
+                            help='Number of product ids stored per user')
+        parser.add_argument('--batch-size', type=int, default=256,
+                            help='Number of users scored per vectorized batch')
+    def handle(self, *args, **options):
+        started = timezone.now()
+        self.stdout.write('Training recommendation engine...')
+        engine = create_engine()
+        model = engine.train()
+        if model.is_empty:
+            self.stdout.write(self.style.WARNING('No interactions found, nothing to precompute.'))
+            return
+        active_ids = set(User.objects.filter(
+            id__in=model.user_ids.tolist(), is_active=True
+        ).values_list('id', flat=True))
+        user_indices = np.array(
+            [idx for idx, user_id in enumerate(model.user_ids.tolist()) if user_id in active_ids],
+            dtype=np.int64
+        )
+        batch_size = options['batch_size']
+        for start in range(0, len(user_indices), batch_size):
+            batch = user_indices[start:start + batch_size]
+            recommendations = engine.recommend_batch(batch, options['top_n'])
+            rows = [
+                UserRecommendation(user_id=int(model.user_ids[idx]), product_ids=product_ids)
+                for idx, product_ids in zip(batch, recommendations)
+            ]
+            with transaction.atomic():
+                UserRecommendation.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['product_ids', 'updated_at'],
+                )
+            self.stdout.write(f'Scored {start + len(batch)}/{len(user_indices)} users')
+        stale, _ = UserRecommendation.objects.filter(updated_at__lt=started).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored recommendations for {len(user_indices)} users ({stale} stale entries removed)'
+        ))
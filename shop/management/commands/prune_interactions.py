@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from shop.retention import prune, report, retention_cutoff
+class Command(BaseCommand):
+    help = ('Archive interactions older than the retention period to gzipped JSONL parts per month and delete them '
+            'in small batches. Their counts stay in the interaction aggregates, the baseline that aggregate rebuilds '
+            'start from, and the popularity counters.')
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'INTERACTION_RETENTION_DAYS', 365),
+                            help='Keep raw interactions from this many recent days')
+        parser.add_argument('--archive-dir', default=getattr(settings, 'INTERACTION_ARCHIVE_DIR', None),
+                            help='Directory for the interactions-YYYY-MM-<first id>.jsonl.gz archive parts')
+        parser.add_argument('--no-archive', action='store_true', help='Delete without archiving')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows archived and deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed and exit')
+    def handle(self, *args, **options):
+        days = options['days']
+        window = getattr(settings, 'RECOMMENDATION_TRAINING_WINDOW_DAYS', None)
+        if getattr(settings, 'RECOMMENDATION_DECAY_HALF_LIFE_DAYS', None) and not window:
+            raise CommandError('Decayed training reads the full raw log; set RECOMMENDATION_TRAINING_WINDOW_DAYS '
+                               'before pruning it.')
+        if window and days < window:
+            raise CommandError(f'--days must cover the {window}-day training window.')
+        archive_dir = None if options['no_archive'] else options['archive_dir']
+        if not options['no_archive'] and not archive_dir:
+            raise CommandError('No archive directory configured; pass --archive-dir or --no-archive.')
+        cutoff = retention_cutoff(days)
+        summary = report(cutoff)
+        for month, rows in summary['months']:
+            self.stdout.write(f'{month}: {rows} interactions')
+        reclaimable = summary['reclaimable_bytes']
+        self.stdout.write(
+            f"{summary['rows']} of {summary['total_rows']} interactions are older than {cutoff:%Y-%m-%d}"
+            + (f', about {filesizeformat(reclaimable)} reclaimable' if reclaimable is not None else '')
+        )
+        if options['dry_run'] or not summary['rows']:
+            return
+        deleted = 0
+        for count in prune(cutoff, archive_dir, options['batch_size'], options['pause']):
+            deleted += count
+            self.stdout.write(f'Deleted {deleted}/{summary["rows"]} interactions')
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {deleted} interactions' + (f', archived to {archive_dir}' if archive_dir else '')
+        ))
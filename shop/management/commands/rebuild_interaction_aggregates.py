@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from shop.aggregation import rebuild
+from shop.models import UserInteraction
+class Command(BaseCommand):
+    help = 'Rebuild the per user and product interaction aggregates from the raw interaction log'
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per insert batch')
+    def handle(self, *args, **options):
+        aggregates = rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {aggregates} aggregates from {UserInteraction.objects.count()} interactions'
+        ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.search import rebuild, uses_fts
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 product search index from the product and category tables'
+    def handle(self, *args, **options):
+        if not uses_fts():
+            raise CommandError('Full-text search indexing is only available on SQLite.')
+        indexed = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products'))
@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from shop.metrics import registry
+from shop.models import Product
+from shop.recommendation import recommendation_engine
+class Command(BaseCommand):
+    help = 'Train or load the recommendation model, exercise it and print its metrics in Prometheus text format'
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=100,
+                            help='Users and products to request recommendations for before reporting')
+        parser.add_argument('--n', type=int, default=10, help='Recommendations per request')
+    def handle(self, *args, **options):
+        recommendation_engine.get_model()
+        sample = options['sample']
+        for user in User.objects.order_by('?')[:sample]:
+            recommendation_engine.get_recommendations(user, n_recommendations=options['n'])
+        for product in Product.objects.select_related('category').order_by('?')[:sample]:
+            recommendation_engine.get_similar_products(product, n_similar=options['n'])
+        self.stdout.write(registry.render(), ending='')
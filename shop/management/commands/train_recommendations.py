@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.recommendation import create_engine
+class Command(BaseCommand):
+    help = 'Train the recommendation engine and publish a model snapshot for all workers'
+    def handle(self, *args, **options):
+        engine = create_engine()
+        if not engine.snapshot_dir:
+            raise CommandError('RECOMMENDATION_SNAPSHOT_DIR is not configured.')
+        self.stdout.write('Training recommendation engine...')
+        model = engine.train()
+        if model.is_empty:
+            self.stdout.write(self.style.WARNING('No interactions found, no snapshot written.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Published snapshot {model.version} to {engine.snapshot_dir} '
+            f'({model.user_item_matrix.shape[0]} users, {len(model.product_ids)} products)'
+        ))
@@ -0,0 +1,133 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   300.0)
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+class Metric:
+    kind = None
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+    def reset(self):
+        with self._lock:
+            self._values = {}
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, key, extra, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.label_names, key, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+class Counter(Metric):
+    kind = 'counter'
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+class Gauge(Metric):
+    kind = 'gauge'
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+class Histogram(Metric):
+    kind = 'histogram'
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return counts[-1]
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f'{self.name}_bucket', key, [('le', _format_value(bound))], count))
+                samples.append((f'{self.name}_sum', key, (), total))
+                samples.append((f'{self.name}_count', key, (), counts[-1]))
+        return samples
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(name, documentation, labels))
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+registry = Registry()
+TRAINS = registry.counter('recommendation_trains_total', 'Completed model trainings')
+TRAIN_STAGE_SECONDS = registry.histogram(
+    'recommendation_train_stage_seconds', 'Time spent in each model training stage', ['stage']
+)
+MODEL_SHAPE = registry.gauge('recommendation_model_shape', 'Users and products in the live model', ['axis'])
+MODEL_NONZEROS = registry.gauge('recommendation_model_nonzeros', 'Stored entries in the user-item matrix')
+MODEL_DENSITY = registry.gauge('recommendation_model_density', 'Fraction of user-item cells with a rating')
+MODEL_BYTES = registry.gauge('recommendation_model_bytes', 'Memory held by the live model', ['component'])
+SCORING_SECONDS = registry.histogram(
+    'recommendation_scoring_seconds', 'Time spent scoring candidates in the model', ['operation']
+)
+PRODUCT_FETCH_SECONDS = registry.histogram(
+    'recommendation_product_fetch_seconds', 'Time spent loading recommended products', ['operation']
+)
+CACHE_REQUESTS = registry.counter(
+    'recommendation_cache_requests_total', 'Result cache lookups', ['operation', 'result']
+)
+RESPONSES = registry.counter(
+    'recommendation_responses_total', 'Recommendation responses by where the results came from',
+    ['operation', 'source']
+)
+POPULAR_TOP_UPS = registry.counter(
+    'recommendation_popular_top_ups_total', 'Responses padded with popular products', ['operation']
+)
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_popularity(apps, schema_editor):
+    UserInteraction = apps.get_model("shop", "UserInteraction")
+    ProductPopularity = apps.get_model("shop", "ProductPopularity")
+    counts = (
+        UserInteraction.objects.order_by()
+        .annotate(day=TruncDate("timestamp"))
+        .values("product_id", "day")
+        .annotate(count=Count("id"))
+    )
+    ProductPopularity.objects.bulk_create(
+        (ProductPopularity(**row) for row in counts.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0002_userrecommendation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductPopularity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="popularity",
+                        to="shop.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Product popularity",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="productpopularity",
+            constraint=models.UniqueConstraint(
+                fields=("product", "day"), name="unique_product_popularity_day"
+            ),
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_aggregates(apps, schema_editor):
+    UserInteraction = apps.get_model("shop", "UserInteraction")
+    InteractionAggregate = apps.get_model("shop", "InteractionAggregate")
+    counts = (
+        UserInteraction.objects.order_by()
+        .values("user_id", "product_id")
+        .annotate(
+            last_seen=Max("timestamp"),
+            **{
+                f"{interaction_type}_count": Count(
+                    "id", filter=Q(interaction_type=interaction_type)
+                )
+                for interaction_type in [
+                    "view",
+                    "like",
+                    "dislike",
+                    "cart_add",
+                    "purchase",
+                ]
+            },
+        )
+    )
+    InteractionAggregate.objects.bulk_create(
+        (InteractionAggregate(**row) for row in counts.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0003_productpopularity"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InteractionAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("view_count", models.IntegerField(default=0)),
+                ("like_count", models.IntegerField(default=0)),
+                ("dislike_count", models.IntegerField(default=0)),
+                ("cart_add_count", models.IntegerField(default=0)),
+                ("purchase_count", models.IntegerField(default=0)),
+                ("last_seen", models.DateTimeField()),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="interaction_aggregates",
+                        to="shop.product",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="interaction_aggregates",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="interactionaggregate",
+            constraint=models.UniqueConstraint(
+                fields=("user", "product"), name="unique_interaction_aggregate"
+            ),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
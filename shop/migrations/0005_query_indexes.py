@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0004_interactionaggregate"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at"], name="order_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("stock__gt", 0)),
+                fields=["id"],
+                name="product_in_stock_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("stock__gt", 0)),
+                fields=["category", "id"],
+                name="product_category_in_stock_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userinteraction",
+            index=models.Index(
+                fields=["user", "product", "interaction_type"],
+                name="interaction_user_product_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userinteraction",
+            index=models.Index(fields=["timestamp"], name="interaction_timestamp_idx"),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:17
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model("shop", "Cart")
+    CartItem = apps.get_model("shop", "CartItem")
+    items = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+    subtotal = models.ExpressionWrapper(
+        F("quantity") * F("product__price"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+    Cart.objects.update(
+        item_count=Coalesce(
+            Subquery(items.annotate(count=Sum("quantity")).values("count")), 0
+        ),
+        total=Coalesce(
+            Subquery(items.annotate(total=Sum(subtotal)).values("total")),
+            Value(Decimal("0.00")),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0005_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="item_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0006_cart_totals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("stock__gt", 0)),
+                fields=["price", "id"],
+                name="product_price_in_stock_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+CREATE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE shop_product_fts USING fts5(
+        name, description, category, prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER shop_product_fts_insert AFTER INSERT ON shop_product BEGIN
+        INSERT INTO shop_product_fts (rowid, name, description, category)
+        SELECT new.id, new.name, new.description, name FROM shop_category WHERE id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER shop_product_fts_update AFTER UPDATE OF name, description, category_id ON shop_product
+    WHEN old.name IS NOT new.name
+        OR old.description IS NOT new.description
+        OR old.category_id IS NOT new.category_id
+    BEGIN
+        UPDATE shop_product_fts
+        SET name = new.name,
+            description = new.description,
+            category = (SELECT name FROM shop_category WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER shop_product_fts_delete AFTER DELETE ON shop_product BEGIN
+        DELETE FROM shop_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER shop_category_fts_update AFTER UPDATE OF name ON shop_category
+    WHEN old.name IS NOT new.name
+    BEGIN
+        UPDATE shop_product_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM shop_product WHERE category_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO shop_product_fts (rowid, name, description, category)
+    SELECT product.id, product.name, product.description, category.name
+    FROM shop_product AS product
+    JOIN shop_category AS category ON category.id = product.category_id
+    """,
+]
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS shop_category_fts_update",
+    "DROP TRIGGER IF EXISTS shop_product_fts_delete",
+    "DROP TRIGGER IF EXISTS shop_product_fts_update",
+    "DROP TRIGGER IF EXISTS shop_product_fts_insert",
+    "DROP TABLE IF EXISTS shop_product_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0007_product_price_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(CREATE_STATEMENTS), run_on_sqlite(DROP_STATEMENTS)
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0008_product_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InteractionBaseline",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("view_count", models.IntegerField(default=0)),
+                ("like_count", models.IntegerField(default=0)),
+                ("dislike_count", models.IntegerField(default=0)),
+                ("cart_add_count", models.IntegerField(default=0)),
+                ("purchase_count", models.IntegerField(default=0)),
+                ("last_seen", models.DateTimeField()),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="interaction_baselines",
+                        to="shop.product",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="interaction_baselines",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="interactionbaseline",
+            constraint=models.UniqueConstraint(
+                fields=("user", "product"), name="unique_interaction_baseline"
+            ),
+        ),
+    ]
@@ -1,8 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 
+SUBTOTAL = models.ExpressionWrapper(
+    F('quantity') * F('product__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+)
+
 class Category(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -22,18 +28,43 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(stock__gt=0), name='product_in_stock_idx'),
+            models.Index(fields=['category', 'id'], condition=models.Q(stock__gt=0),
+                         name='product_category_in_stock_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(stock__gt=0), name='product_price_in_stock_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
+    item_count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Cart for {self.user.username}"
     
     def get_total(self):
-        return sum(item.get_subtotal() for item in self.items.all())
+        return self.total
+    
+    def get_items(self):
+        return self.items.select_related('product__category').annotate(subtotal=SUBTOTAL).order_by('id')
+    
+    @classmethod
+    def refresh_totals(cls, carts):
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return carts.update(
+            item_count=Coalesce(Subquery(items.annotate(count=Sum('quantity')).values('count')), 0),
+            total=Coalesce(
+                Subquery(items.annotate(total=Sum(SUBTOTAL)).values('total')),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            )
+        )
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -64,6 +95,9 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
@@ -96,6 +130,68 @@ class UserInteraction(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', 'product', 'interaction_type'], name='interaction_user_product_idx'),
+            models.Index(fields=['timestamp'], name='interaction_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.interaction_type} - {self.product.name}"
+
+class UserRecommendation(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stored_recommendations')
+    product_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Recommendations for {self.user.username}"
+
+class ProductPopularity(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='popularity')
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = 'Product popularity'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_popularity_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.day}: {self.count}"
+
+class InteractionAggregate(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interaction_aggregates')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='interaction_aggregates')
+    view_count = models.IntegerField(default=0)
+    like_count = models.IntegerField(default=0)
+    dislike_count = models.IntegerField(default=0)
+    cart_add_count = models.IntegerField(default=0)
+    purchase_count = models.IntegerField(default=0)
+    last_seen = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_interaction_aggregate'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.product.name}"
+
+class InteractionBaseline(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interaction_baselines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='interaction_baselines')
+    view_count = models.IntegerField(default=0)
+    like_count = models.IntegerField(default=0)
+    dislike_count = models.IntegerField(default=0)
+    cart_add_count = models.IntegerField(default=0)
+    purchase_count = models.IntegerField(default=0)
+    last_seen = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_interaction_baseline'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.product.name}"
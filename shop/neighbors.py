@@ -0,0 +1,164 @@
+import numpy as np
+from .similarity import DEFAULT_BLOCK_SIZE, iter_similarity_blocks
+class NeighborIndex:
+    def __init__(self, indices, scores, block_rows=4096):
+        # rows live in blocks that updates copy and swap in whole, so readers never see a partly written row
+        self.k = indices.shape[1]
+        self.block_rows = block_rows
+        self.blocks = [
+            (indices[start:start + block_rows], scores[start:start + block_rows])
+            for start in range(0, len(indices), block_rows)
+        ]
+        self._arrays = (indices, scores)
+    @classmethod
+    def build(cls, user_item_matrix, n_neighbors=50, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float64):
+        n_items = user_item_matrix.shape[1]
+        k = max(min(n_neighbors, n_items - 1), 0)
+        indices = np.full((n_items, k), -1, dtype=np.int32)
+        scores = np.zeros((n_items, k), dtype=dtype)
+        if k == 0:
+            return cls(indices, scores)
+        for start, block in iter_similarity_blocks(user_item_matrix, block_size, dtype):
+            rows = np.arange(len(block))
+            block[rows, rows + start] = -np.inf
+            top = np.argpartition(block, -k, axis=1)[:, -k:]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            positive = top_scores > 0
+            indices[start:start + len(block)] = np.where(positive, top, -1)
+            scores[start:start + len(block)] = np.where(positive, top_scores, 0)
+        return cls(indices, scores)
+    def __len__(self):
+        return sum(len(indices) for indices, _ in self.blocks)
+    @property
+    def nbytes(self):
+        return sum(indices.nbytes + scores.nbytes for indices, scores in self.blocks)
+    @property
+    def indices(self):
+        return self.arrays()[0]
+    @property
+    def scores(self):
+        return self.arrays()[1]
+    def arrays(self):
+        arrays = self._arrays
+        if arrays is None:
+            blocks = self.blocks
+            arrays = (
+                np.concatenate([indices for indices, _ in blocks]),
+                np.concatenate([scores for _, scores in blocks]),
+            )
+        return arrays
+    def row(self, item_idx):
+        indices, scores = self.blocks[item_idx // self.block_rows]
+        return indices[item_idx % self.block_rows], scores[item_idx % self.block_rows]
+    def rows(self, item_indices):
+        item_indices = np.asarray(item_indices, dtype=np.int64)
+        blocks = self.blocks
+        indices = np.full((len(item_indices), self.k), -1, dtype=blocks[0][0].dtype if blocks else np.int32)
+        scores = np.zeros((len(item_indices), self.k), dtype=blocks[0][1].dtype if blocks else np.float64)
+        block_ids = item_indices // self.block_rows
+        for block_id in np.unique(block_ids).tolist():
+            in_block = block_ids == block_id
+            offsets = item_indices[in_block] % self.block_rows
+            indices[in_block] = blocks[block_id][0][offsets]
+            scores[in_block] = blocks[block_id][1][offsets]
+        return indices, scores
+    def neighbors(self, item_idx):
+        indices, scores = self.row(item_idx)
+        valid = indices >= 0
+        return indices[valid], scores[valid]
+    def predict_scores(self, user_ratings, k=10, max_elements=1 << 22):
+        n_users = 1 if user_ratings.ndim == 1 else len(user_ratings)
+        step = max(1, max_elements // max(1, n_users * self.k))
+        predicted = np.zeros(user_ratings.shape, dtype=np.float64)
+        block_start = 0
+        for block_indices, block_scores in self.blocks:
+            for offset in range(0, len(block_indices), step):
+                indices = block_indices[offset:offset + step]
+                start = block_start + offset
+                valid = indices >= 0
+                neighbor_ratings = np.where(valid, user_ratings[..., indices], 0)
+                rated = neighbor_ratings > 0
+                rated &= np.cumsum(rated, axis=-1) <= k
+                weights = np.where(rated, block_scores[offset:offset + step], 0)
+                weighted_sum = (weights * neighbor_ratings).sum(axis=-1)
+                similarity_sum = weights.sum(axis=-1)
+                np.divide(
+                    weighted_sum,
+                    similarity_sum,
+                    out=predicted[..., start:start + len(indices)],
+                    where=similarity_sum > 0
+                )
+            block_start += len(block_indices)
+        return np.where(user_ratings > 0, user_ratings, predicted)
+    def update_item(self, item_idx, candidates, similarities, rescore=None):
+        # only candidates can gain, lose or change a similarity with item_idx; every other pair stays at zero.
+        # a full row whose score for item_idx drops may now be missing its next best neighbor, so it is
+        # rebuilt from rescore(row) -> (candidates, similarities); without rescore it stays approximate
+        if self.k == 0:
+            return
+        candidates = np.asarray(candidates, dtype=np.int64)
+        similarities = np.asarray(similarities, dtype=np.float64)
+        others = candidates != item_idx
+        candidates, similarities = candidates[others], similarities[others]
+        indices, scores = self.rows(candidates)
+        present = indices == item_idx
+        floor = np.where(indices[:, -1] >= 0, scores[:, -1], 0)
+        affected = present.any(axis=1) | (similarities > floor)
+        stale = np.zeros(len(candidates), dtype=bool)
+        if rescore is not None:
+            stale = (similarities < np.where(present, scores, 0).sum(axis=1)) & present.any(axis=1)
+            stale &= indices[:, -1] >= 0
+        patched = affected & ~stale
+        indices, scores = self._with_entry(indices[patched], scores[patched], item_idx, similarities[patched])
+        rebuilt = [(item_idx, candidates, similarities)]
+        rebuilt.extend((row, *rescore(row)) for row in candidates[stale].tolist())
+        rebuilt_indices, rebuilt_scores = self._from_candidates(rebuilt, indices.dtype, scores.dtype)
+        self._publish(
+            np.concatenate([candidates[patched], [row for row, _, _ in rebuilt]]).astype(np.int64),
+            np.vstack([indices, rebuilt_indices]),
+            np.vstack([scores, rebuilt_scores])
+        )
+    def _from_candidates(self, rows, index_dtype, score_dtype):
+        width = max(len(candidates) for _, candidates, _ in rows)
+        ids = np.full((len(rows), width), -1, dtype=np.int64)
+        values = np.zeros((len(rows), width), dtype=np.float64)
+        for position, (row, candidates, similarities) in enumerate(rows):
+            keep = np.asarray(candidates) != row
+            ids[position, :keep.sum()] = np.asarray(candidates)[keep]
+            values[position, :keep.sum()] = np.asarray(similarities)[keep]
+        return self._with_entries(
+            np.full((len(rows), 0), -1, dtype=index_dtype), np.zeros((len(rows), 0), dtype=score_dtype), ids, values
+        )
+    def _with_entry(self, indices, scores, item_idx, new_scores):
+        return self._with_entries(
+            np.where(indices == item_idx, -1, indices), scores,
+            np.full((len(indices), 1), item_idx), new_scores[:, None]
+        )
+    def _with_entries(self, indices, scores, new_indices, new_scores):
+        new_indices = np.broadcast_to(new_indices, (len(indices), np.shape(new_indices)[-1]))
+        new_scores = np.broadcast_to(new_scores, new_indices.shape)
+        ids = np.hstack([indices, new_indices])
+        values = np.hstack([np.where(indices >= 0, scores, -np.inf), np.where(new_scores > 0, new_scores, -np.inf)])
+        order = np.argsort(-values, axis=1, kind='stable')[:, :self.k]
+        ids = np.take_along_axis(ids, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        valid = values > -np.inf
+        padding = self.k - ids.shape[1]
+        return (
+            np.pad(np.where(valid, ids, -1), ((0, 0), (0, padding)), constant_values=-1).astype(indices.dtype),
+            np.pad(np.where(valid, values, 0), ((0, 0), (0, padding))).astype(scores.dtype),
+        )
+    def _publish(self, rows, indices, scores):
+        blocks = list(self.blocks)
+        block_ids = rows // self.block_rows
+        for block_id in np.unique(block_ids).tolist():
+            in_block = block_ids == block_id
+            block_indices, block_scores = (np.array(array) for array in blocks[block_id])
+            block_indices[rows[in_block] % self.block_rows] = indices[in_block]
+            block_scores[rows[in_block] % self.block_rows] = scores[in_block]
+            blocks[block_id] = (block_indices, block_scores)
+        self._arrays = None
+        self.blocks = blocks
@@ -0,0 +1,18 @@
+def keyset_page(queryset, size, after=None, before=None):
+    if before is not None:
+        rows = list(queryset.filter(id__gt=before).order_by('id')[:size + 1])
+        has_previous = len(rows) > size
+        rows = rows[:size][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(id__lt=after)
+        rows = list(queryset.order_by('-id')[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        has_previous = after is not None
+    return {
+        'items': rows,
+        'previous': rows[0].id if has_previous and rows else None,
+        'next': rows[-1].id if has_next and rows else None,
+    }
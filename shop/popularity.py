@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Product, ProductPopularity
+class PopularityStore:
+    def __init__(self):
+        self._tallies = {}
+        self._categories = {}
+        self._uncategorized = set()
+        self._rankings = {}
+        self._lock = threading.Lock()
+    @property
+    def ttl(self):
+        return getattr(settings, 'POPULARITY_CACHE_TTL', 300)
+    def clear(self):
+        with self._lock:
+            self._tallies = {}
+            self._categories = {}
+            self._uncategorized = set()
+            self._rankings = {}
+    def record(self, product_id, day, delta=1):
+        counters = ProductPopularity.objects.filter(product_id=product_id, day=day)
+        if not counters.update(count=F('count') + delta) and delta > 0:
+            try:
+                with transaction.atomic():
+                    ProductPopularity.objects.create(product_id=product_id, day=day, count=delta)
+            except IntegrityError:
+                counters.update(count=F('count') + delta)
+        transaction.on_commit(lambda: self._increment(product_id, delta))
+    def _increment(self, product_id, delta):
+        with self._lock:
+            for _, counts in self._tallies.values():
+                counts[product_id] = counts.get(product_id, 0) + delta
+            if product_id not in self._categories:
+                self._uncategorized.add(product_id)
+    def _load(self, days):
+        counters = ProductPopularity.objects.order_by()
+        if days:
+            counters = counters.filter(day__gt=timezone.localdate() - timedelta(days=days))
+        counts = {}
+        for product_id, category_id, total in counters.values_list(
+            'product_id', 'product__category_id'
+        ).annotate(total=Sum('count')).iterator():
+            counts[product_id] = total
+            self._categories[product_id] = category_id
+        return counts
+    def ranking(self, category_id=None, days=None):
+        with self._lock:
+            loaded_at, counts = self._tallies.get(days, (None, None))
+            if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+                counts = self._load(days)
+                self._tallies[days] = (time.monotonic(), counts)
+                self._rankings = {key: value for key, value in self._rankings.items() if key[1] != days}
+            ranking = self._rankings.get((category_id, days))
+            if ranking is None:
+                if category_id is not None and self._uncategorized:
+                    self._categories.update(
+                        Product.objects.filter(id__in=self._uncategorized).values_list('id', 'category_id')
+                    )
+                    self._uncategorized = set()
+                ranking = sorted(
+                    (product_id for product_id, count in counts.items() if count > 0 and (
+                        category_id is None or self._categories.get(product_id) == category_id
+                    )),
+                    key=lambda product_id: (-counts[product_id], product_id)
+                )
+                self._rankings[(category_id, days)] = ranking
+            return ranking
+    def top(self, n, exclude_ids=(), category_id=None, days=None):
+        exclude_ids = set(exclude_ids)
+        result = []
+        for product_id in self.ranking(category_id, days):
+            if product_id not in exclude_ids:
+                result.append(product_id)
+                if len(result) == n:
+                    break
+        return result
+popularity_store = PopularityStore()
@@ -1,111 +1,455 @@
+import threading
+import time
 import numpy as np
-from django.db import models
-from django.contrib.auth.models import User
-from .models import Product, UserInteraction
-from . import recommendation_cython
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from .metrics import (
+    CACHE_REQUESTS, MODEL_BYTES, MODEL_DENSITY, MODEL_NONZEROS, MODEL_SHAPE, POPULAR_TOP_UPS,
+    PRODUCT_FETCH_SECONDS, RESPONSES, SCORING_SECONDS, TRAIN_STAGE_SECONDS, TRAINS
+)
+from .models import InteractionAggregate, Product, UserRecommendation
+from .popularity import popularity_store
+from .sparse import CSRMatrix
+from .ann import LSHIndex
+from .neighbors import NeighborIndex
+from .windowing import InteractionWindowCache
+from .snapshots import acquire_trainer_lock, current_version, load_snapshot, save_snapshot
+INTERACTION_WEIGHTS = {
+    'view': 1.0,
+    'cart_add': 3.0,
+    'like': 4.0,
+    'purchase': 5.0,
+    'dislike': -2.0,
+}
+EXCLUSIVE_INTERACTIONS = {'like': 'dislike', 'dislike': 'like'}
+def top_n_indices(scores, n):
+    n = min(n, scores.shape[-1])
+    if n <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    top = np.argpartition(-scores, n - 1, axis=-1)[..., :n]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(top, order, axis=-1)
+class RecommendationModel:
+    kind = 'neighbors'
+    def __init__(self, user_ids, product_ids, user_item_matrix, neighbor_index=None, version=None,
+                 built_at=None, eligible=None):
+        self.user_ids = user_ids
+        self.product_ids = product_ids
+        self.user_item_matrix = user_item_matrix
+        self.neighbor_index = neighbor_index
+        self.ann_index = None
+        self.version = version if version is not None else time.time_ns()
+        self.built_at = built_at if built_at is not None else time.time()
+        self.user_index = dict(zip(user_ids.tolist(), range(len(user_ids))))
+        self.product_index = dict(zip(product_ids.tolist(), range(len(product_ids))))
+        self.eligible = eligible if eligible is not None else np.ones(len(product_ids), dtype=bool)
+        self.eligibility_checked_at = time.monotonic() if eligible is not None else None
+        self.user_overrides = {}
+        self.item_overrides = {}
+        self._item_matrix = None
+        self._norms_sq = None
+    @property
+    def is_empty(self):
+        return self.neighbor_index is None
+    def index_arrays(self):
+        indices, scores = self.neighbor_index.arrays()
+        return {'neighbor_indices': indices, 'neighbor_scores': scores}
+    def index_meta(self):
+        return {}
+    def predict_scores(self, user_indices, user_ratings):
+        return self.neighbor_index.predict_scores(user_ratings, k=10)
+    def similar_items(self, product_idx, n):
+        indices, scores = self.neighbor_index.neighbors(product_idx)
+        eligible = self.eligible[indices]
+        return indices[eligible][:n], scores[eligible][:n]
+    def refresh_eligibility(self):
+        in_stock_ids = np.fromiter(
+            Product.objects.filter(stock__gt=0).values_list('id', flat=True).iterator(),
+            dtype=np.int64
+        )
+        self.eligible = np.isin(self.product_ids, in_stock_ids)
+        self.eligibility_checked_at = time.monotonic()
+    def set_stock(self, product_id, stock):
+        product_idx = self.product_index.get(product_id)
+        if product_idx is not None:
+            self.eligible[product_idx] = stock > 0
+    def _base_row(self, user_idx):
+        if user_idx < self.user_item_matrix.shape[0]:
+            return self.user_item_matrix.row_slice(user_idx)
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+    def _apply_overrides(self, indices, data, overrides):
+        if not overrides:
+            return indices, data
+        overrides = tuple(overrides.items())
+        changed = np.array([key for key, _ in overrides], dtype=np.int64)
+        keep = ~np.isin(indices, changed)
+        return (
+            np.concatenate([indices[keep], changed]),
+            np.concatenate([data[keep], np.array([value for _, value in overrides])])
+        )
+    def sparse_row(self, user_idx):
+        indices, data = self._base_row(user_idx)
+        return self._apply_overrides(indices, data, self.user_overrides.get(user_idx))
+    def sparse_column(self, product_idx):
+        if self._item_matrix is None:
+            self._item_matrix = self.user_item_matrix.transpose()
+        indices, data = self._item_matrix.row_slice(product_idx)
+        return self._apply_overrides(indices, data, self.item_overrides.get(product_idx))
+    def user_row(self, user_idx):
+        row = np.zeros(len(self.product_ids), dtype=np.float64)
+        indices, data = self.sparse_row(user_idx)
+        row[indices] = data
+        return row
+    def user_rows(self, user_indices):
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        rows = np.zeros((len(user_indices), len(self.product_ids)), dtype=np.float64)
+        in_base = user_indices < self.user_item_matrix.shape[0]
+        rows[in_base] = self.user_item_matrix.getrows(user_indices[in_base])
+        for position, user_idx in enumerate(user_indices.tolist()):
+            for product_idx, value in tuple(self.user_overrides.get(user_idx, {}).items()):
+                rows[position, product_idx] = value
+        return rows
+    def apply_interaction(self, user_id, product_id, weight, clip=(0, 5)):
+        product_idx = self.product_index.get(product_id)
+        if product_idx is None or self.is_empty:
+            return False
+        user_idx = self.user_index.get(user_id)
+        if user_idx is None:
+            user_idx = len(self.user_ids)
+            self.user_ids = np.append(self.user_ids, user_id)
+            self.user_index[user_id] = user_idx
+        indices, data = self.sparse_row(user_idx)
+        old = float(data[indices == product_idx].sum())
+        new = float(np.clip(old + weight, *clip))
+        if new == old:
+            return True
+        self.user_overrides.setdefault(user_idx, {})[product_idx] = new
+        self.item_overrides.setdefault(product_idx, {})[user_idx] = new
+        self.update_index(user_idx, product_idx, old, new)
+        return True
+    def update_index(self, user_idx, product_idx, old, new):
+        if self._norms_sq is None:
+            self._norms_sq = self.user_item_matrix.column_norms() ** 2
+        self._norms_sq[product_idx] = max(self._norms_sq[product_idx] + new * new - old * old, 0.0)
+        # the user's own items may have lost their only co-rater, so they are rescored too
+        candidates, similarities = self.item_similarities(product_idx, self.sparse_row(user_idx)[0])
+        self.neighbor_index.update_item(product_idx, candidates, similarities, rescore=self.item_similarities)
+    def item_similarities(self, product_idx, extra_candidates=()):
+        raters, ratings = self.sparse_column(product_idx)
+        raters = raters.astype(np.int64)
+        overridden = np.fromiter(tuple(self.user_overrides), dtype=np.int64)
+        in_base = (raters < self.user_item_matrix.shape[0]) & ~np.isin(raters, overridden)
+        rater_positions, items, values = self.user_item_matrix.gather(raters[in_base])
+        items = [items.astype(np.int64)]
+        products = [values * ratings[in_base][rater_positions]]
+        for other_idx, rating in zip(raters[~in_base].tolist(), ratings[~in_base].tolist()):
+            row_indices, row_data = self.sparse_row(other_idx)
+            items.append(row_indices.astype(np.int64))
+            products.append(row_data * rating)
+        items = np.concatenate(items)
+        candidates, inverse = np.unique(
+            np.concatenate([items, np.asarray(extra_candidates, dtype=np.int64)]), return_inverse=True
+        )
+        dots = np.bincount(inverse[:len(items)], weights=np.concatenate(products), minlength=len(candidates))
+        denominator = np.sqrt(self._norms_sq[candidates] * self._norms_sq[product_idx])
+        similarities = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+        return candidates, similarities
 class RecommendationEngine:
     def __init__(self):
-        self.user_item_matrix = None
-        self.similarity_matrix = None
-        self.product_ids = []
-        self.user_ids = []
+        self.model = None
+        self._update_lock = threading.Lock()
+        self.similarity_block_size = getattr(settings, 'RECOMMENDATION_SIMILARITY_BLOCK_SIZE', 256)
+        self.similarity_dtype = np.dtype(getattr(settings, 'RECOMMENDATION_SIMILARITY_DTYPE', 'float64'))
+        self.n_neighbors = getattr(settings, 'RECOMMENDATION_NEIGHBORS', 50)
+        self.snapshot_dir = getattr(settings, 'RECOMMENDATION_SNAPSHOT_DIR', None)
+        self.snapshot_check_interval = getattr(settings, 'RECOMMENDATION_SNAPSHOT_CHECK_INTERVAL', 5.0)
+        self._snapshot_checked_at = None
+        self.elect_snapshot_trainer = getattr(settings, 'RECOMMENDATION_SNAPSHOT_ELECT_TRAINER', True)
+        self._trainer_lock = None
+        self.similar_backend = getattr(settings, 'RECOMMENDATION_SIMILAR_BACKEND', 'exact')
+        self.lsh_tables = getattr(settings, 'RECOMMENDATION_LSH_TABLES', 16)
+        self.lsh_bits = getattr(settings, 'RECOMMENDATION_LSH_BITS', 10)
+        self.lsh_multiprobe = getattr(settings, 'RECOMMENDATION_LSH_MULTIPROBE', True)
+        self.training_window_days = getattr(settings, 'RECOMMENDATION_TRAINING_WINDOW_DAYS', None)
+        self.decay_half_life_days = getattr(settings, 'RECOMMENDATION_DECAY_HALF_LIFE_DAYS', None)
+        self.eligibility_ttl = getattr(settings, 'RECOMMENDATION_ELIGIBILITY_TTL', 60.0)
+        self.cache_alias = getattr(settings, 'RECOMMENDATION_CACHE_ALIAS', 'default')
+        self.cache_ttl = getattr(settings, 'RECOMMENDATION_CACHE_TTL', 300)
+        self.window_cache = InteractionWindowCache(INTERACTION_WEIGHTS, EXCLUSIVE_INTERACTIONS)
+    def interaction_aggregates(self):
+        return InteractionAggregate.objects.order_by()
+    def _read_interactions(self):
+        if self.training_window_days or self.decay_half_life_days:
+            return self.window_cache.read(self.training_window_days, self.decay_half_life_days)
+        weight = sum(
+            (F(f'{interaction_type}_count') * value for interaction_type, value in INTERACTION_WEIGHTS.items()),
+            Value(0.0)
+        )
+        aggregates = self.interaction_aggregates().values_list('user_id', 'product_id').annotate(
+            weight=ExpressionWrapper(weight, output_field=FloatField())
+        )
+        rows = np.fromiter(
+            aggregates.iterator(chunk_size=10000),
+            dtype=[('user', np.int64), ('product', np.int64), ('weight', np.float64)]
+        )
+        return rows['user'], rows['product'], rows['weight']
     def build_user_item_matrix(self):
-        users = User.objects.all()
-        products = Product.objects.all()
-        self.user_ids = [u.id for u in users]
-        self.product_ids = [p.id for p in products]
-        n_users = len(self.user_ids)
-        n_products = len(self.product_ids)
-        self.user_item_matrix = np.zeros((n_users, n_products), dtype=np.float64)
-        interaction_weights = {
-            'view': 1.0,
-            'cart_add': 3.0,
-            'like': 4.0,
-            'purchase': 5.0,
-            'dislike': -2.0,
-        }
-        interactions = UserInteraction.objects.all()
-        for interaction in interactions:
-            try:
-                user_idx = self.user_ids.index(interaction.user_id)
-                product_idx = self.product_ids.index(interaction.product_id)
-                weight = interaction_weights.get(interaction.interaction_type, 1.0)
-                self.user_item_matrix[user_idx, product_idx] += weight
-            except ValueError:
-                continue
-        self.user_item_matrix = np.clip(self.user_item_matrix, 0, 5)
-        return self.user_item_matrix
+        built_at = time.time()
+        with TRAIN_STAGE_SECONDS.time(stage='catalog'):
+            catalog = np.fromiter(
+                Product.objects.order_by('id').values_list('id', 'stock').iterator(),
+                dtype=[('id', np.int64), ('stock', np.int64)]
+            )
+        product_ids = catalog['id']
+        with TRAIN_STAGE_SECONDS.time(stage='interactions'):
+            users, products, weights = self._read_interactions()
+        started = time.perf_counter()
+        product_idx = np.searchsorted(product_ids, products)
+        known = product_idx < len(product_ids)
+        known[known] = product_ids[product_idx[known]] == products[known]
+        user_ids, user_idx = np.unique(users[known], return_inverse=True)
+        user_item_matrix = CSRMatrix.from_coo(
+            user_idx,
+            product_idx[known],
+            weights[known],
+            (len(user_ids), len(product_ids))
+        ).clip(0, 5)
+        TRAIN_STAGE_SECONDS.observe(time.perf_counter() - started, stage='matrix')
+        return RecommendationModel(
+            user_ids,
+            product_ids,
+            user_item_matrix,
+            built_at=built_at,
+            eligible=catalog['stock'] > 0
+        )
+    def build_model(self):
+        model = self.build_user_item_matrix()
+        if model.user_item_matrix.size:
+            with TRAIN_STAGE_SECONDS.time(stage='neighbors'):
+                model.neighbor_index = NeighborIndex.build(
+                    model.user_item_matrix,
+                    n_neighbors=self.n_neighbors,
+                    block_size=self.similarity_block_size,
+                    dtype=self.similarity_dtype
+                )
+            if self.similar_backend == 'lsh':
+                with TRAIN_STAGE_SECONDS.time(stage='ann'):
+                    model.ann_index = LSHIndex.build(
+                        model.user_item_matrix,
+                        n_tables=self.lsh_tables,
+                        n_bits=self.lsh_bits,
+                        multiprobe=self.lsh_multiprobe
+                    )
+        return model
     def train(self):
-        self.build_user_item_matrix()
-        if self.user_item_matrix.size == 0:
-            return
-        self.similarity_matrix = recommendation_cython.compute_similarity_matrix(
-            self.user_item_matrix
+        with TRAIN_STAGE_SECONDS.time(stage='total'):
+            model = self.build_model()
+            if self.snapshot_dir and not model.is_empty:
+                with TRAIN_STAGE_SECONDS.time(stage='snapshot'):
+                    save_snapshot(model, self.snapshot_dir)
+        self.model = model
+        TRAINS.inc()
+        self.publish_model_metrics(model)
+        return model
+    def is_snapshot_trainer(self):
+        if self._trainer_lock is None and self.elect_snapshot_trainer:
+            self._trainer_lock = acquire_trainer_lock(self.snapshot_dir)
+        return self._trainer_lock is not None
+    def retrain(self):
+        if not self.snapshot_dir or self.is_snapshot_trainer():
+            return self.train()
+        # other workers apply live deltas and pick up the elected trainer's snapshots
+        model = self.refresh_from_snapshot(force=True)
+        if model is None:
+            ids = np.empty(0, dtype=np.int64)
+            empty = CSRMatrix(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0), (0, 0))
+            model = RecommendationModel(ids, ids, empty, version=0, eligible=np.empty(0, dtype=bool))
+            with self._update_lock:
+                self.model = model
+        return model
+    def publish_model_metrics(self, model):
+        matrix = model.user_item_matrix
+        MODEL_SHAPE.set(matrix.shape[0], axis='users')
+        MODEL_SHAPE.set(matrix.shape[1], axis='products')
+        MODEL_NONZEROS.set(matrix.nnz)
+        MODEL_DENSITY.set(matrix.nnz / matrix.size if matrix.size else 0.0)
+        MODEL_BYTES.set(matrix.nbytes, component='matrix')
+        MODEL_BYTES.set(
+            0 if model.is_empty else sum(values.nbytes for values in model.index_arrays().values()),
+            component=model.kind
         )
+        MODEL_BYTES.set(model.ann_index.nbytes if model.ann_index else 0, component='ann')
+    def refresh_from_snapshot(self, force=False):
+        now = time.monotonic()
+        checked_at = self._snapshot_checked_at
+        if not force and checked_at is not None and now - checked_at < self.snapshot_check_interval:
+            return self.model
+        self._snapshot_checked_at = now
+        version = current_version(self.snapshot_dir)
+        model = self.model
+        if version is not None and (model is None or version > model.version):
+            model = load_snapshot(self.snapshot_dir, version)
+            with self._update_lock:
+                self.model = model
+            self.publish_model_metrics(model)
+        return model
+    def apply_interaction(self, user_id, product_id, weight, recorded_at=None):
+        with self._update_lock:
+            model = self.model
+            if model is None or (recorded_at is not None and recorded_at < model.built_at):
+                return True
+            applied = model.apply_interaction(user_id, product_id, weight)
+        if applied:
+            self.invalidate_users([user_id])
+        return applied
+    def update_stock(self, product_id, stock):
+        model = self.model
+        if model is not None:
+            model.set_stock(product_id, stock)
+    def get_model(self):
+        model = self.refresh_from_snapshot() if self.snapshot_dir else self.model
+        if model is None:
+            model = self.retrain()
+        checked_at = model.eligibility_checked_at
+        if checked_at is None or time.monotonic() - checked_at > self.eligibility_ttl:
+            model.refresh_eligibility()
+        return model
+    def _in_stock(self):
+        return Product.objects.filter(stock__gt=0).select_related('category')
+    @property
+    def result_cache(self):
+        return caches[self.cache_alias]
+    def _get_cached_products(self, key, params):
+        operation = key.split(':', 1)[0]
+        entry = self.result_cache.get(key)
+        if entry is None or entry[0] != params:
+            CACHE_REQUESTS.inc(operation=operation, result='miss')
+            return None
+        with PRODUCT_FETCH_SECONDS.time(operation=operation):
+            products = self._in_stock().in_bulk(entry[1])
+        if len(products) < len(entry[1]):
+            CACHE_REQUESTS.inc(operation=operation, result='stale')
+            return None
+        CACHE_REQUESTS.inc(operation=operation, result='hit')
+        RESPONSES.inc(operation=operation, source='cache')
+        return [products[pid] for pid in entry[1]]
+    def _set_cached_products(self, key, params, products):
+        self.result_cache.set(key, (params, [p.id for p in products]), self.cache_ttl)
+    def invalidate_users(self, user_ids):
+        self.result_cache.delete_many([f'recommendations:{user_id}' for user_id in user_ids])
+    def recommend_batch(self, user_indices, n_recommendations=10):
+        model = self.get_model()
+        with SCORING_SECONDS.time(operation='batch'):
+            user_ratings = model.user_rows(user_indices)
+            predicted_scores = model.predict_scores(user_indices, user_ratings)
+            predicted_scores[(user_ratings > 0) | ~model.eligible] = -np.inf
+            top_indices = top_n_indices(predicted_scores, n_recommendations)
+            top_scores = np.take_along_axis(predicted_scores, top_indices, axis=1)
+        return [
+            model.product_ids[indices[scores > -np.inf]].tolist()
+            for indices, scores in zip(top_indices, top_scores)
+        ]
     def get_recommendations(self, user, n_recommendations=10, exclude_interacted=True):
-        if self.user_item_matrix is None or self.similarity_matrix is None:
-            self.train()
-        if not self.user_ids or not self.product_ids:
-            return self._get_popular_products(n_recommendations)
-        try:
-            user_idx = self.user_ids.index(user.id)
-        except ValueError:
-            return self._get_popular_products(n_recommendations)
-        user_ratings = self.user_item_matrix[user_idx, :].copy()
-        predicted_scores = recommendation_cython.predict_scores(
-            user_ratings, 
-            self.similarity_matrix,
-            k=10
-        )
         if exclude_interacted:
-            interacted_indices = np.where(user_ratings > 0)[0]
-            predicted_scores[interacted_indices] = -np.inf
-        top_indices = np.argsort(predicted_scores)[::-1][:n_recommendations]
-        recommended_product_ids = [self.product_ids[idx] for idx in top_indices 
-                                  if predicted_scores[idx] > -np.inf]
-        products = Product.objects.filter(id__in=recommended_product_ids, stock__gt=0)
-        product_dict = {p.id: p for p in products}
-        recommended_products = [product_dict[pid] for pid in recommended_product_ids 
-                               if pid in product_dict]
+            stored_ids = UserRecommendation.objects.filter(user_id=user.id).values_list(
+                'product_ids', flat=True
+            ).first()
+            if stored_ids is not None:
+                RESPONSES.inc(operation='recommendations', source='stored')
+                return self._get_stored_recommendations(user, stored_ids, n_recommendations)
+        model = self.get_model()
+        user_idx = None if model.is_empty else model.user_index.get(user.id)
+        if user_idx is None:
+            RESPONSES.inc(operation='recommendations', source='popular')
+            return self._get_popular_products(n_recommendations)
+        cache_key = f'recommendations:{user.id}'
+        cache_params = (model.version, n_recommendations, exclude_interacted)
+        cached = self._get_cached_products(cache_key, cache_params)
+        if cached is not None:
+            return cached
+        with SCORING_SECONDS.time(operation='recommendations'):
+            user_ratings = model.user_row(user_idx)
+            predicted_scores = model.predict_scores(user_idx, user_ratings)
+            candidates = model.eligible
+            if exclude_interacted:
+                candidates = candidates & (user_ratings <= 0)
+            predicted_scores[~candidates] = -np.inf
+            top_indices = top_n_indices(predicted_scores, n_recommendations)
+            top_indices = top_indices[predicted_scores[top_indices] > -np.inf]
+        recommended_product_ids = model.product_ids[top_indices].tolist()
+        with PRODUCT_FETCH_SECONDS.time(operation='recommendations'):
+            products = self._in_stock().in_bulk(recommended_product_ids)
+        recommended_products = [products[pid] for pid in recommended_product_ids if pid in products]
+        RESPONSES.inc(operation='recommendations', source='model')
         if len(recommended_products) < n_recommendations:
+            POPULAR_TOP_UPS.inc(operation='recommendations')
             remaining = n_recommendations - len(recommended_products)
             popular = self._get_popular_products(remaining, 
                                                 exclude_ids=[p.id for p in recommended_products])
             recommended_products.extend(popular)
-        return recommended_products[:n_recommendations]
-    def get_similar_products(self, product, n_similar=5):
-        if self.similarity_matrix is None:
-            self.train()
-        try:
-            product_idx = self.product_ids.index(product.id)
-        except (ValueError, AttributeError):
-            return list(Product.objects.filter(
-                category=product.category,
-                stock__gt=0
-            ).exclude(id=product.id)[:n_similar])
-        similarities = self.similarity_matrix[product_idx, :]
-        similarities[product_idx] = -np.inf
-        top_indices = np.argsort(similarities)[::-1][:n_similar]
-        similar_product_ids = [self.product_ids[idx] for idx in top_indices]
-        products = Product.objects.filter(id__in=similar_product_ids, stock__gt=0)
-        product_dict = {p.id: p for p in products}
-        return [product_dict[pid] for pid in similar_product_ids if pid in product_dict]
+        recommended_products = recommended_products[:n_recommendations]
+        self._set_cached_products(cache_key, cache_params, recommended_products)
+        return recommended_products
+    def _get_stored_recommendations(self, user, stored_ids, n_recommendations):
+        # the list predates the user's latest interactions, so drop anything they have touched since
+        products = self._in_stock().exclude(interaction_aggregates__user_id=user.id).in_bulk(stored_ids)
+        recommended_products = [products[pid] for pid in stored_ids if pid in products]
+        recommended_products = recommended_products[:n_recommendations]
+        if len(recommended_products) < n_recommendations:
+            POPULAR_TOP_UPS.inc(operation='recommendations')
+            remaining = n_recommendations - len(recommended_products)
+            popular = self._get_popular_products(remaining,
+                                                exclude_ids=[p.id for p in recommended_products])
+            recommended_products.extend(popular)
+        return recommended_products
+    def get_similar_products(self, product, n_similar=5, exact=None):
+        if exact is None:
+            exact = self.similar_backend != 'lsh'
+        model = self.get_model()
+        exact = exact or model.ann_index is None
+        product_idx = model.product_index.get(getattr(product, 'id', None))
+        cache_key = f'similar_products:{product.id}'
+        cache_params = (model.version, n_similar, exact)
+        cached = self._get_cached_products(cache_key, cache_params)
+        if cached is not None:
+            return cached
+        neighbor_indices = []
+        if product_idx is not None and not model.is_empty:
+            with SCORING_SECONDS.time(operation='similar_products'):
+                if exact:
+                    neighbor_indices, _ = model.similar_items(product_idx, n_similar)
+                else:
+                    neighbor_indices, _ = model.ann_index.query(
+                        product_idx, n_similar, eligible=model.eligible
+                    )
+        if not len(neighbor_indices):
+            RESPONSES.inc(operation='similar_products', source='category')
+            return list(
+                self._in_stock().filter(category_id=product.category_id).exclude(id=product.id)[:n_similar]
+            )
+        similar_product_ids = model.product_ids[neighbor_indices[:n_similar]].tolist()
+        with PRODUCT_FETCH_SECONDS.time(operation='similar_products'):
+            products = self._in_stock().in_bulk(similar_product_ids)
+        RESPONSES.inc(operation='similar_products', source='model')
+        similar_products = [products[pid] for pid in similar_product_ids if pid in products]
+        self._set_cached_products(cache_key, cache_params, similar_products)
+        return similar_products
     def _get_popular_products(self, n=10, exclude_ids=None):
-        exclude_ids = exclude_ids or []
-        interactions = UserInteraction.objects.exclude(
-            product_id__in=exclude_ids
-        ).values('product_id').annotate(
-            count=models.Count('id')
-        ).order_by('-count')[:n]
-        popular_ids = [i['product_id'] for i in interactions]
-        products = Product.objects.filter(id__in=popular_ids, stock__gt=0)
-        product_dict = {p.id: p for p in products}
-        result = [product_dict[pid] for pid in popular_ids if pid in product_dict]
+        exclude_ids = list(exclude_ids or [])
+        popular_ids = popularity_store.top(2 * n, exclude_ids=exclude_ids)
+        products = self._in_stock().in_bulk(popular_ids)
+        result = [products[pid] for pid in popular_ids if pid in products][:n]
         if len(result) < n:
             remaining = n - len(result)
-            recent = Product.objects.filter(stock__gt=0).exclude(
+            recent = self._in_stock().exclude(
                 id__in=exclude_ids + [p.id for p in result]
             )[:remaining]
             result.extend(list(recent))
         return result
-recommendation_engine = RecommendationEngine()
\ No newline at end of file
+def create_engine():
+    if getattr(settings, 'RECOMMENDATION_ENGINE', 'item_knn') == 'als':
+        from .factorization import FactorizationEngine
+        return FactorizationEngine()
+    return RecommendationEngine()
+recommendation_engine = create_engine()
\ No newline at end of file
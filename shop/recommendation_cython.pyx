@@ -79,3 +79,26 @@ def predict_scores(np.ndarray[np.float64_t, ndim=1] user_ratings,
             predicted_scores[i] = weighted_sum / similarity_sum
     
     return predicted_scores
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def csr_dense_matmul(np.int64_t[::1] indptr,
+                     np.int32_t[::1] indices,
+                     cython.floating[::1] data,
+                     cython.floating[:, ::1] dense,
+                     cython.floating[:, ::1] out):
+    cdef Py_ssize_t n_rows = indptr.shape[0] - 1
+    cdef Py_ssize_t n_cols = dense.shape[1]
+    cdef Py_ssize_t i, k, c, col
+    cdef cython.floating value
+    
+    with nogil:
+        for i in range(n_rows):
+            for k in range(indptr[i], indptr[i + 1]):
+                col = indices[k]
+                value = data[k]
+                for c in range(n_cols):
+                    out[i, c] += value * dense[col, c]
+    
+    return np.asarray(out)
@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import re
+import time
+from datetime import timedelta
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from . import aggregation
+from .models import InteractionBaseline, UserInteraction
+ARCHIVE_FIELDS = ('id', 'user_id', 'product_id', 'interaction_type', 'timestamp')
+PART_NAME = re.compile(r'interactions-\d{4}-\d{2}-(\d+)\.jsonl\.gz')
+def retention_cutoff(days):
+    return timezone.now() - timedelta(days=days)
+def expired(cutoff):
+    return UserInteraction.objects.order_by().filter(timestamp__lt=cutoff)
+def table_bytes(model):
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                    '(SELECT name FROM sqlite_master WHERE tbl_name = %s)', [table]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            else:
+                return None
+            return cursor.fetchone()[0] or 0
+    except DatabaseError:
+        return None
+def report(cutoff):
+    months = expired(cutoff).annotate(month=TruncMonth('timestamp')).values('month').annotate(
+        rows=Count('id')
+    ).order_by('month')
+    months = [(f"{row['month']:%Y-%m}", row['rows']) for row in months]
+    rows = sum(count for _, count in months)
+    total_rows = UserInteraction.objects.count()
+    size = table_bytes(UserInteraction)
+    return {
+        'months': months,
+        'rows': rows,
+        'total_rows': total_rows,
+        'table_bytes': size,
+        'reclaimable_bytes': size * rows // total_rows if size is not None and total_rows else None,
+    }
+def _sync_directory(path):
+    if os.name == 'posix':
+        descriptor = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+def archive(rows, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    months = {}
+    for row in rows:
+        record = dict(zip(ARCHIVE_FIELDS, row))
+        timestamp = timezone.localtime(record['timestamp'])
+        record['timestamp'] = timestamp.isoformat()
+        months.setdefault(f'{timestamp:%Y-%m}', []).append((record['id'], json.dumps(record)))
+    paths = []
+    for month, lines in sorted(months.items()):
+        # one part per month and batch, named by its first id, so a retried batch replaces its own parts
+        path = os.path.join(archive_dir, f'interactions-{month}-{lines[0][0]:012d}.jsonl.gz')
+        with open(f'{path}.partial', 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive_file:
+                archive_file.write(('\n'.join(line for _, line in lines) + '\n').encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(f'{path}.partial', path)
+        paths.append(path)
+    _sync_directory(archive_dir)
+    return paths
+def discard_unfinished(archive_dir, chunk_size=500):
+    if not os.path.isdir(archive_dir):
+        return []
+    parts = {}
+    for name in os.listdir(archive_dir):
+        match = PART_NAME.fullmatch(name)
+        if match:
+            parts[int(match.group(1))] = name
+        elif name.endswith('.jsonl.gz.partial'):
+            os.remove(os.path.join(archive_dir, name))
+    # a batch deletes all of its rows or none, so a part whose first row still exists was never committed
+    first_ids = sorted(parts)
+    discarded = []
+    for start in range(0, len(first_ids), chunk_size):
+        for interaction_id in UserInteraction.objects.filter(pk__in=first_ids[start:start + chunk_size]).values_list(
+            'pk', flat=True
+        ):
+            os.remove(os.path.join(archive_dir, parts[interaction_id]))
+            discarded.append(parts[interaction_id])
+    if discarded:
+        _sync_directory(archive_dir)
+    return discarded
+def _delete(interaction_ids):
+    table = connection.ops.quote_name(UserInteraction._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(interaction_ids))})', interaction_ids
+        )
+        return cursor.rowcount
+def prune(cutoff, archive_dir=None, batch_size=5000, pause=0.0):
+    if archive_dir is not None:
+        discard_unfinished(archive_dir)
+    rows = expired(cutoff).order_by('id').values_list(*ARCHIVE_FIELDS)
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        if archive_dir is not None:
+            archive(batch, archive_dir)
+        events = sorted(
+            (UserInteraction(**dict(zip(ARCHIVE_FIELDS, row))) for row in batch),
+            key=lambda interaction: (interaction.timestamp, interaction.id)
+        )
+        # skip the delete signals: the counts stay in the aggregates and move into the baseline
+        with transaction.atomic():
+            aggregation.record(events, model=InteractionBaseline)
+            deleted = _delete([row[0] for row in batch])
+        last_id = batch[-1][0]
+        yield deleted
+        if pause:
+            time.sleep(pause)
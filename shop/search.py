@@ -0,0 +1,57 @@
+import re
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Product
+TOKEN = re.compile(r'\w+')
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+def tokenize(query):
+    return TOKEN.findall(query.lower())[:16]
+def match_expression(tokens):
+    return ' '.join(f'"{token}"*' for token in tokens)
+def rank_candidates():
+    return getattr(settings, 'SEARCH_RANK_CANDIDATES', 2000)
+def uses_fts():
+    return connection.vendor == 'sqlite'
+def filter_matching(queryset, query):
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    if uses_fts():
+        return queryset.filter(id__in=RawSQL(
+            'SELECT rowid FROM shop_product_fts WHERE shop_product_fts MATCH %s', [match_expression(tokens)]
+        ))
+    for token in tokens:
+        queryset = queryset.filter(
+            Q(name__icontains=token) | Q(description__icontains=token) | Q(category__name__icontains=token)
+        )
+    return queryset
+def search_product_ids(query, limit, offset=0):
+    tokens = tokenize(query)
+    limit = min(limit, rank_candidates() - offset)
+    if not tokens or limit <= 0:
+        return []
+    if not uses_fts():
+        products = filter_matching(Product.objects.filter(stock__gt=0), query).order_by('-id')
+        return list(products.values_list('id', flat=True)[offset:offset + limit])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT shop_product_fts.rowid FROM shop_product_fts '
+            'JOIN shop_product AS product ON product.id = shop_product_fts.rowid '
+            'WHERE shop_product_fts MATCH %s AND product.stock > 0 '
+            'ORDER BY bm25(shop_product_fts, %s, %s, %s), shop_product_fts.rowid DESC LIMIT %s OFFSET %s',
+            [match_expression(tokens), *BM25_WEIGHTS, limit, offset]
+        )
+        return [row[0] for row in cursor.fetchall()]
+def rebuild():
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('DELETE FROM shop_product_fts')
+        cursor.execute(
+            'INSERT INTO shop_product_fts (rowid, name, description, category) '
+            'SELECT product.id, product.name, product.description, category.name '
+            'FROM shop_product AS product JOIN shop_category AS category ON category.id = product.category_id'
+        )
+        cursor.execute("INSERT INTO shop_product_fts (shop_product_fts) VALUES ('optimize')")
+        cursor.execute('SELECT COUNT(*) FROM shop_product_fts')
+        return cursor.fetchone()[0]
@@ -0,0 +1,58 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import aggregation
+from .catalog import catalog_changed
+from .models import Cart, CartItem, Category, Product, UserInteraction
+from .popularity import popularity_store
+from .recommendation import INTERACTION_WEIGHTS, recommendation_engine
+from .trainer import recommendation_trainer
+from .windowing import invalidate_cached_day
+def _record_interaction(instance, sign):
+    weight = sign * INTERACTION_WEIGHTS.get(instance.interaction_type, 1.0)
+    transaction.on_commit(lambda: recommendation_trainer.record_interaction(
+        instance.user_id, instance.product_id, weight
+    ))
+def record_interactions(interactions):
+    daily_counts = Counter(
+        (interaction.product_id, timezone.localdate(interaction.timestamp)) for interaction in interactions
+    )
+    for interaction in interactions:
+        _record_interaction(interaction, 1)
+    for (user_id, product_id), removed in aggregation.record(interactions).items():
+        transaction.on_commit(lambda user_id=user_id, product_id=product_id, removed=removed: (
+            recommendation_trainer.record_interaction(user_id, product_id, -removed)
+        ))
+    for (product_id, day), count in daily_counts.items():
+        popularity_store.record(product_id, day, delta=count)
+    recommendation_engine.invalidate_users({interaction.user_id for interaction in interactions})
+@receiver(post_save, sender=UserInteraction)
+def interaction_saved(sender, instance, created, **kwargs):
+    if created:
+        record_interactions([instance])
+@receiver(post_delete, sender=UserInteraction)
+def interaction_deleted(sender, instance, **kwargs):
+    invalidate_cached_day(instance.timestamp)
+    aggregation.remove(instance)
+    popularity_store.record(instance.product_id, timezone.localdate(instance.timestamp), delta=-1)
+    _record_interaction(instance, -1)
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    recommendation_engine.update_stock(instance.id, instance.stock)
+    if not created:
+        Cart.refresh_totals(Cart.objects.filter(items__product_id=instance.id))
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    recommendation_engine.update_stock(instance.id, 0)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_saved(sender, **kwargs):
+    catalog_changed()
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    Cart.refresh_totals(Cart.objects.filter(pk=instance.cart_id))
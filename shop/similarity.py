@@ -0,0 +1,47 @@
+import numpy as np
+from .sparse import CSRMatrix
+DEFAULT_BLOCK_SIZE = 256
+def normalize_columns(user_item_matrix, dtype=np.float64):
+    norms = user_item_matrix.column_norms()
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    data = (user_item_matrix.data * scale[user_item_matrix.indices]).astype(dtype)
+    normalized = CSRMatrix(user_item_matrix.indptr, user_item_matrix.indices, data, user_item_matrix.shape)
+    return normalized, norms
+def iter_similarity_blocks(user_item_matrix, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float64,
+                           max_pairs=1 << 20):
+    # a block only expands the rows of users who rated one of its items, so the work over all blocks is
+    # the sum of squared user degrees and memory is block_size x n_items plus max_pairs co-ratings
+    n_users, n_items = user_item_matrix.shape
+    normalized, norms = normalize_columns(user_item_matrix, dtype)
+    item_major = normalized.transpose()
+    degrees = np.diff(normalized.indptr)
+    for start in range(0, n_items, block_size):
+        stop = min(start + block_size, n_items)
+        width = stop - start
+        lo, hi = item_major.indptr[start], item_major.indptr[stop]
+        block_rows = np.repeat(np.arange(width, dtype=np.int64), np.diff(item_major.indptr[start:stop + 1]))
+        raters = item_major.indices[lo:hi]
+        values = item_major.data[lo:hi].astype(np.float64)
+        block = np.zeros(width * n_items, dtype=np.float64)
+        pairs = np.cumsum(degrees[raters])
+        chunk_start = 0
+        while chunk_start < len(raters):
+            offset = pairs[chunk_start - 1] if chunk_start else 0
+            chunk_stop = max(int(np.searchsorted(pairs, offset + max_pairs, side='right')), chunk_start + 1)
+            entry_positions, items, co_values = normalized.gather(raters[chunk_start:chunk_stop])
+            entry_positions += chunk_start
+            block += np.bincount(
+                block_rows[entry_positions] * n_items + items,
+                weights=values[entry_positions] * co_values,
+                minlength=width * n_items
+            )
+            chunk_start = chunk_stop
+        block = block.reshape(width, n_items).astype(dtype, copy=False)
+        block[np.arange(width), np.arange(start, stop)] = norms[start:stop] > 0
+        yield start, block
+def compute_similarity_matrix(user_item_matrix, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float64):
+    n_items = user_item_matrix.shape[1]
+    similarity_matrix = np.zeros((n_items, n_items), dtype=dtype)
+    for start, block in iter_similarity_blocks(user_item_matrix, block_size, dtype):
+        similarity_matrix[start:start + len(block)] = block
+    return similarity_matrix
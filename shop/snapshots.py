@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+from .ann import LSHIndex
+from .neighbors import NeighborIndex
+from .sparse import CSRMatrix
+MARKER = 'CURRENT'
+TRAINER_LOCK = 'TRAINER.lock'
+WRITABLE = {'neighbor_indices', 'neighbor_scores'}
+def current_version(directory):
+    try:
+        return int((Path(directory) / MARKER).read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+def acquire_trainer_lock(directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    handle = open(directory / TRAINER_LOCK, 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+def save_snapshot(model, directory, keep=3):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / str(model.version)
+    staging = directory / f'{model.version}.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    matrix = model.user_item_matrix
+    arrays = {
+        'user_ids': model.user_ids,
+        'product_ids': model.product_ids,
+        'indptr': matrix.indptr,
+        'indices': matrix.indices,
+        'data': matrix.data,
+        'eligible': model.eligible,
+    }
+    arrays.update(model.index_arrays())
+    if model.ann_index is not None:
+        arrays.update(model.ann_index.arrays())
+    for name, values in arrays.items():
+        np.save(staging / f'{name}.npy', np.ascontiguousarray(values))
+    (staging / 'meta.json').write_text(json.dumps({
+        'version': model.version,
+        'kind': model.kind,
+        'built_at': model.built_at,
+        'shape': list(matrix.shape),
+        **model.index_meta(),
+        'ann': model.ann_index.meta() if model.ann_index is not None else None,
+    }))
+    os.replace(staging, target)
+    # a slower run that started earlier must not move the marker back
+    if (current_version(directory) or 0) < model.version:
+        marker = directory / f'{MARKER}.tmp'
+        marker.write_text(str(model.version))
+        os.replace(marker, directory / MARKER)
+    versions = sorted(int(path.name) for path in directory.iterdir() if path.name.isdigit())
+    for version in versions[:-keep]:
+        shutil.rmtree(directory / str(version), ignore_errors=True)
+    return target
+def load_snapshot(directory, version=None):
+    from .factorization import FactorizationModel
+    from .recommendation import RecommendationModel
+    version = version if version is not None else current_version(directory)
+    if version is None:
+        return None
+    path = Path(directory) / str(version)
+    meta = json.loads((path / 'meta.json').read_text())
+    arrays = {
+        array_path.stem: np.load(array_path, mmap_mode='c' if array_path.stem in WRITABLE else 'r')
+        for array_path in path.glob('*.npy')
+    }
+    if 'eligible' in arrays:
+        arrays['eligible'] = np.array(arrays['eligible'])
+    args = (
+        arrays['user_ids'],
+        arrays['product_ids'],
+        CSRMatrix(arrays['indptr'], arrays['indices'], arrays['data'], meta['shape']),
+    )
+    kwargs = {
+        'version': meta['version'],
+        'built_at': meta['built_at'],
+        'eligible': arrays.get('eligible'),
+    }
+    if meta.get('kind') == FactorizationModel.kind:
+        model = FactorizationModel(
+            *args,
+            arrays['user_factors'],
+            arrays['item_factors'],
+            regularization=meta['regularization'],
+            alpha=meta['alpha'],
+            **kwargs
+        )
+    else:
+        model = RecommendationModel(
+            *args,
+            NeighborIndex(arrays['neighbor_indices'], arrays['neighbor_scores']),
+            **kwargs
+        )
+    if meta.get('ann'):
+        model.ann_index = LSHIndex.from_arrays(arrays, meta['ann'])
+    return model
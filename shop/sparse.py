@@ -0,0 +1,67 @@
+import numpy as np
+class CSRMatrix:
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = tuple(shape)
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape):
+        n_rows, n_cols = shape
+        keys = np.asarray(rows, dtype=np.int64) * n_cols + np.asarray(cols, dtype=np.int64)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        data = np.bincount(inverse, weights=values, minlength=len(keys)).astype(np.float64)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n_cols, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, (keys % n_cols).astype(np.int32), data, shape)
+    @property
+    def nnz(self):
+        return len(self.data)
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+    def clip(self, a_min, a_max):
+        data = np.clip(self.data, a_min, a_max)
+        keep = data != 0
+        if keep.all():
+            return CSRMatrix(self.indptr, self.indices, data, self.shape)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        row_nnz = np.bincount(rows[keep], minlength=self.shape[0])
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(row_nnz, out=indptr[1:])
+        return CSRMatrix(indptr, self.indices[keep], data[keep], self.shape)
+    def row_slice(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+    def getrow(self, i):
+        row = np.zeros(self.shape[1], dtype=self.data.dtype)
+        indices, data = self.row_slice(i)
+        row[indices] = data
+        return row
+    def gather(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        counts = self.indptr[rows + 1] - self.indptr[rows]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(self.indptr[rows], counts) + offsets
+        return np.repeat(np.arange(len(rows)), counts), self.indices[positions], self.data[positions]
+    def getrows(self, rows):
+        row_positions, cols, data = self.gather(rows)
+        dense = np.zeros((len(rows), self.shape[1]), dtype=self.data.dtype)
+        dense[row_positions, cols] = data
+        return dense
+    def toarray(self):
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        dense[rows, self.indices] = self.data
+        return dense
+    def transpose(self):
+        rows = np.repeat(np.arange(self.shape[0], dtype=np.int64), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind='stable')
+        indptr = np.zeros(self.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.shape[1]), out=indptr[1:])
+        return CSRMatrix(indptr, rows[order].astype(np.int32), self.data[order], self.shape[::-1])
+    def column_norms(self):
+        return np.sqrt(np.bincount(self.indices, weights=self.data ** 2, minlength=self.shape[1]))
@@ -0,0 +1,47 @@
+import numpy as np
+from .models import UserInteraction
+INTERACTION_TYPES = [value for value, _ in UserInteraction.INTERACTION_TYPES]
+INTERACTION_MIX = {
+    'view': 0.72,
+    'like': 0.08,
+    'dislike': 0.02,
+    'cart_add': 0.12,
+    'purchase': 0.06,
+}
+def power_law_probabilities(n, alpha, rng=None):
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -alpha
+    if rng is not None:
+        weights = weights[rng.permutation(n)]
+    return weights / weights.sum()
+def sample(rng, probabilities, size):
+    cumulative = np.cumsum(probabilities)
+    picks = np.searchsorted(cumulative, rng.random(size) * cumulative[-1], side='right')
+    return np.minimum(picks, len(probabilities) - 1)
+def generate_interactions(n_users, n_products, n_interactions, n_clusters=20, affinity=0.7, seed=0,
+                          user_alpha=0.8, product_alpha=1.0, product_clusters=None):
+    rng = np.random.default_rng(seed)
+    user_p = power_law_probabilities(n_users, user_alpha, rng)
+    product_p = power_law_probabilities(n_products, product_alpha, rng)
+    if product_clusters is None:
+        n_clusters = max(min(n_clusters, n_products), 1)
+        product_clusters = rng.integers(n_clusters, size=n_products)
+    else:
+        n_clusters = int(product_clusters.max()) + 1
+    user_clusters = rng.integers(n_clusters, size=n_users)
+    users = sample(rng, user_p, n_interactions)
+    products = sample(rng, product_p, n_interactions)
+    local = np.nonzero(rng.random(n_interactions) < affinity)[0]
+    grouped = np.argsort(product_clusters, kind='stable')
+    cumulative = np.cumsum(product_p[grouped])
+    bounds = np.searchsorted(product_clusters[grouped], np.arange(n_clusters + 1))
+    mass = np.concatenate([[0.0], cumulative])[bounds]
+    clusters = user_clusters[users[local]]
+    targets = mass[clusters] + rng.random(len(local)) * (mass[clusters + 1] - mass[clusters])
+    picks = np.minimum(np.searchsorted(cumulative, targets, side='right'), n_products - 1)
+    products[local] = grouped[picks]
+    types = rng.choice(
+        len(INTERACTION_TYPES),
+        size=n_interactions,
+        p=[INTERACTION_MIX[value] for value in INTERACTION_TYPES]
+    )
+    return users, products, types, product_clusters
@@ -1,10 +1,13 @@
-from django.test import TestCase, Client
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from decimal import Decimal
+from io import StringIO
 from shop.models import Category, Product, Cart, CartItem, Order, OrderItem, UserInteraction
+from shop.popularity import popularity_store
 
 
+@override_settings(RECOMMENDATION_TRAINING_MODE='sync', INTERACTION_LOG_MODE='sync')
 class ComprehensiveEcommerceTest(TestCase):
     """Single comprehensive test to verify all e-commerce functionality"""
     
@@ -197,3 +200,1087 @@ class ComprehensiveEcommerceTest(TestCase):
         print(f"   - Order tracking: ✓")
         print(f"   - Stock management: ✓")
         print(f"   - User interactions: ✓")
+
+
+@override_settings(RECOMMENDATION_TRAINING_MODE='sync', INTERACTION_LOG_MODE='sync')
+class RecommendationEngineTest(TestCase):
+    """Tests for the recommendation engine internals"""
+    
+    def setUp(self):
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(
+                name=f'Book {i}',
+                description='A book',
+                price=Decimal('10.00'),
+                category=self.category,
+                stock=5
+            )
+            for i in range(4)
+        ]
+        self.users = [
+            User.objects.create_user(username=f'reader{i}', password='pass12345')
+            for i in range(3)
+        ]
+        popularity_store.clear()
+        self.addCleanup(popularity_store.clear)
+    
+    def interact(self, user, product, interaction_type):
+        UserInteraction.objects.create(user=user, product=product, interaction_type=interaction_type)
+    
+    def test_build_user_item_matrix_is_sparse_and_skips_inactive_users(self):
+        from shop.recommendation import RecommendationEngine
+        
+        self.interact(self.users[0], self.products[0], 'view')
+        self.interact(self.users[0], self.products[0], 'purchase')
+        self.interact(self.users[0], self.products[2], 'dislike')
+        self.interact(self.users[2], self.products[1], 'like')
+        self.interact(self.users[2], self.products[3], 'cart_add')
+        
+        model = RecommendationEngine().build_user_item_matrix()
+        matrix = model.user_item_matrix
+        
+        # users[1] never interacted, so only two rows are built
+        self.assertEqual(list(model.user_ids), [self.users[0].id, self.users[2].id])
+        self.assertEqual(matrix.shape, (2, 4))
+        # the dislike clips to zero and is not stored
+        self.assertEqual(matrix.nnz, 3)
+        expected = [
+            [5.0, 0.0, 0.0, 0.0],
+            [0.0, 4.0, 0.0, 3.0],
+        ]
+        self.assertEqual(matrix.toarray().tolist(), expected)
+        self.assertEqual(matrix.getrow(model.user_index[self.users[2].id]).tolist(), expected[1])
+    
+    def test_blocked_similarity_matches_reference_kernel(self):
+        import numpy as np
+        from shop import recommendation_cython
+        from shop.recommendation import RecommendationEngine
+        from shop.similarity import compute_similarity_matrix
+        
+        for user, product, interaction_type in [
+            (0, 0, 'view'), (0, 1, 'like'), (1, 1, 'purchase'),
+            (1, 2, 'cart_add'), (2, 0, 'like'), (2, 2, 'view'),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        
+        matrix = RecommendationEngine().build_user_item_matrix().user_item_matrix
+        expected = recommendation_cython.compute_similarity_matrix(matrix.toarray())
+        
+        for block_size in (1, 3, 256):
+            np.testing.assert_allclose(
+                compute_similarity_matrix(matrix, block_size=block_size), expected, atol=1e-12
+            )
+        similarity32 = compute_similarity_matrix(matrix, block_size=2, dtype=np.float32)
+        self.assertEqual(similarity32.dtype, np.float32)
+        np.testing.assert_allclose(similarity32, expected, atol=1e-6)
+    
+    def test_neighbor_index_scoring_matches_dense_prediction(self):
+        import numpy as np
+        from shop import recommendation_cython
+        from shop.neighbors import NeighborIndex
+        from shop.recommendation import RecommendationEngine
+        from shop.similarity import compute_similarity_matrix
+        
+        for user, product, interaction_type in [
+            (0, 0, 'view'), (0, 1, 'like'), (1, 1, 'purchase'), (1, 2, 'cart_add'),
+            (1, 3, 'view'), (2, 0, 'like'), (2, 2, 'view'),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        
+        engine = RecommendationEngine()
+        matrix = engine.build_user_item_matrix().user_item_matrix
+        index = NeighborIndex.build(matrix, n_neighbors=10, block_size=2)
+        similarity = compute_similarity_matrix(matrix)
+        
+        self.assertEqual(index.indices.shape, (4, 3))
+        for row in range(matrix.shape[0]):
+            ratings = matrix.getrow(row)
+            np.testing.assert_allclose(
+                index.predict_scores(ratings, k=2),
+                recommendation_cython.predict_scores(ratings, similarity, k=2)
+            )
+        batch = np.vstack([matrix.getrow(row) for row in range(matrix.shape[0])])
+        np.testing.assert_allclose(
+            index.predict_scores(batch, k=2),
+            np.vstack([index.predict_scores(row, k=2) for row in batch])
+        )
+        
+        engine.train()
+        similar = engine.get_similar_products(self.products[0], n_similar=1)
+        best = int(np.argsort(-similarity[0, 1:])[0]) + 1
+        self.assertEqual(similar, [self.products[best]])
+    
+    def test_precomputed_recommendations_are_served_from_table(self):
+        from django.core.management import call_command
+        from shop.models import UserRecommendation
+        from shop.recommendation import RecommendationEngine
+        
+        for user, product, interaction_type in [
+            (0, 0, 'like'), (0, 1, 'like'), (1, 0, 'like'), (1, 2, 'purchase'),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        
+        call_command('precompute_recommendations', top_n=3, batch_size=1, stdout=StringIO())
+        
+        stored = UserRecommendation.objects.get(user=self.users[0])
+        self.assertEqual(stored.product_ids[0], self.products[2].id)
+        self.assertNotIn(self.products[0].id, stored.product_ids)
+        self.assertFalse(UserRecommendation.objects.filter(user=self.users[2]).exists())
+        
+        engine = RecommendationEngine()
+        with self.assertNumQueries(2):
+            recommendations = engine.get_recommendations(self.users[0], n_recommendations=1)
+        self.assertEqual(recommendations, [self.products[2]])
+        self.assertIsNone(engine.model)
+        
+        # the stored list survives new interactions, but any worker skips the items they touched
+        self.interact(self.users[0], self.products[2], 'view')
+        self.assertTrue(UserRecommendation.objects.filter(user=self.users[0]).exists())
+        engine = RecommendationEngine()
+        with self.assertNumQueries(2):
+            recommendations = engine.get_recommendations(self.users[0], n_recommendations=1)
+        self.assertEqual(recommendations, [self.products[3]])
+        self.assertIsNone(engine.model)
+    
+    def test_incremental_updates_match_full_rebuild(self):
+        import numpy as np
+        from shop.recommendation import RecommendationEngine, recommendation_engine
+        
+        for user, product, interaction_type in [
+            (0, 0, 'like'), (0, 1, 'view'), (1, 1, 'purchase'), (1, 2, 'cart_add'),
+            (2, 2, 'view'), (2, 3, 'like'),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        trained = recommendation_engine.train()
+        self.addCleanup(setattr, recommendation_engine, 'model', None)
+        trained_indices = trained.neighbor_index.indices
+        base_indices = trained_indices.copy()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interact(self.users[2], self.products[1], 'like')
+            self.interact(self.users[1], self.products[3], 'view')
+            UserInteraction.objects.filter(user=self.users[0], product=self.products[0]).delete()
+        
+        live = recommendation_engine.model
+        rebuilt = RecommendationEngine().build_model()
+        for user_id, user_idx in rebuilt.user_index.items():
+            np.testing.assert_allclose(live.user_row(live.user_index[user_id]), rebuilt.user_row(user_idx))
+        for product_idx in range(len(self.products)):
+            live_ids, live_scores = live.neighbor_index.neighbors(product_idx)
+            rebuilt_ids, rebuilt_scores = rebuilt.neighbor_index.neighbors(product_idx)
+            self.assertEqual(sorted(live_ids.tolist()), sorted(rebuilt_ids.tolist()))
+            np.testing.assert_allclose(
+                live_scores[np.argsort(live_ids)], rebuilt_scores[np.argsort(rebuilt_ids)]
+            )
+        # updated rows are published in copied blocks, the trained arrays are never written
+        np.testing.assert_array_equal(trained_indices, base_indices)
+        self.assertFalse(np.array_equal(live.neighbor_index.indices, base_indices))
+        ratings = rebuilt.user_item_matrix.toarray()
+        np.testing.assert_allclose(
+            live.neighbor_index.predict_scores(ratings), rebuilt.neighbor_index.predict_scores(ratings)
+        )
+    
+    @override_settings(RECOMMENDATION_NEIGHBORS=5)
+    def test_incremental_updates_restore_neighbors_pushed_out_of_full_rows(self):
+        import random
+        import numpy as np
+        from shop.recommendation import RecommendationEngine, recommendation_engine
+        
+        rng = random.Random(3)
+        products = self.products + [
+            Product.objects.create(name=f'Extra {i}', description='', price=Decimal('5.00'),
+                                   category=self.category, stock=5)
+            for i in range(26)
+        ]
+        users = self.users + [User.objects.create_user(username=f'extra{i}') for i in range(9)]
+        for _ in range(120):
+            self.interact(rng.choice(users), rng.choice(products), rng.choice(['view', 'like', 'cart_add']))
+        recommendation_engine.n_neighbors = 5
+        self.addCleanup(setattr, recommendation_engine, 'n_neighbors', 50)
+        recommendation_engine.train()
+        self.addCleanup(setattr, recommendation_engine, 'model', None)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(40):
+                self.interact(rng.choice(users), rng.choice(products), 'view')
+        
+        live = recommendation_engine.model
+        rebuilt = RecommendationEngine().build_model()
+        for product_idx in range(len(products)):
+            # compared by score, since tied neighbors may come back in either order
+            np.testing.assert_allclose(
+                live.neighbor_index.neighbors(product_idx)[1], rebuilt.neighbor_index.neighbors(product_idx)[1]
+            )
+    
+    def test_workers_share_published_snapshots(self):
+        import tempfile
+        import numpy as np
+        from shop.recommendation import RecommendationEngine
+        
+        for user, product, interaction_type in [(0, 0, 'like'), (0, 1, 'like'), (1, 0, 'view')]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(RECOMMENDATION_SNAPSHOT_DIR=snapshot_dir):
+                writer = RecommendationEngine()
+                reader = RecommendationEngine()
+            published = writer.train()
+            
+            with self.assertNumQueries(0):
+                loaded = reader.get_model()
+            self.assertEqual(loaded.version, published.version)
+            self.assertIsInstance(loaded.user_item_matrix.data, np.memmap)
+            self.assertIsInstance(loaded.neighbor_index.indices, np.memmap)
+            np.testing.assert_array_equal(loaded.user_row(0), published.user_row(0))
+            np.testing.assert_array_equal(loaded.neighbor_index.indices, published.neighbor_index.indices)
+            
+            self.interact(self.users[1], self.products[1], 'like')
+            republished = writer.train()
+            self.assertIs(reader.get_model(), loaded)
+            self.assertEqual(reader.refresh_from_snapshot(force=True).version, republished.version)
+    
+    def test_only_the_elected_worker_retrains_in_snapshot_mode(self):
+        import tempfile
+        from unittest import mock
+        from shop.recommendation import RecommendationEngine
+        from shop.trainer import BackgroundTrainer
+        
+        for user, product, interaction_type in [(0, 0, 'like'), (0, 1, 'like'), (1, 0, 'view')]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(RECOMMENDATION_SNAPSHOT_DIR=snapshot_dir):
+                elected = RecommendationEngine()
+                follower = RecommendationEngine()
+            self.assertTrue(elected.is_snapshot_trainer())
+            self.addCleanup(elected._trainer_lock.close)
+            self.assertFalse(follower.is_snapshot_trainer())
+            
+            with mock.patch.object(follower, 'train') as train:
+                # nothing published yet, so the follower serves popular products until a snapshot appears
+                self.assertTrue(follower.get_model().is_empty)
+                self.assertEqual(follower.get_recommendations(self.users[0], n_recommendations=1),
+                                 [self.products[0]])
+                BackgroundTrainer(elected)._train()
+                BackgroundTrainer(follower)._train()
+            train.assert_not_called()
+            self.assertEqual(follower.model.version, elected.model.version)
+    
+    def test_lsh_backend_agrees_with_exact_neighbors(self):
+        import json
+        import tempfile
+        import numpy as np
+        from django.core.management import call_command
+        from shop.recommendation import RecommendationEngine
+        from shop.snapshots import load_snapshot, save_snapshot
+        
+        for user, product, interaction_type in [
+            (0, 0, 'like'), (0, 1, 'view'), (1, 1, 'purchase'), (1, 2, 'cart_add'),
+            (2, 2, 'view'), (2, 0, 'like'), (2, 3, 'purchase'),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        
+        with override_settings(RECOMMENDATION_SIMILAR_BACKEND='lsh', RECOMMENDATION_LSH_TABLES=16,
+                               RECOMMENDATION_LSH_BITS=1):
+            engine = RecommendationEngine()
+        model = engine.train()
+        self.assertIsNotNone(model.ann_index)
+        for product in self.products:
+            self.assertEqual(
+                engine.get_similar_products(product, n_similar=3),
+                engine.get_similar_products(product, n_similar=3, exact=True)
+            )
+        
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            save_snapshot(model, snapshot_dir)
+            loaded = load_snapshot(snapshot_dir)
+            self.assertEqual(loaded.ann_index.seed, model.ann_index.seed)
+            for product_idx in range(len(model.product_ids)):
+                expected = model.ann_index.query(product_idx, 3)
+                actual = loaded.ann_index.query(product_idx, 3)
+                self.assertTrue(all(np.array_equal(a, b) for a, b in zip(expected, actual)))
+        
+        output = StringIO()
+        call_command('ann_report', tables='2', bits='4', n=2, sample=4, json=True, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual([row['backend'] for row in report['results']], ['exact', 'lsh', 'lsh'])
+    
+    def test_windowed_training_decays_weights_and_reads_only_new_rows(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from shop.recommendation import RecommendationEngine
+        
+        now = timezone.now()
+        for user, product, interaction_type, age_days in [
+            (0, 0, 'like', 40), (0, 1, 'purchase', 3), (1, 1, 'like', 1), (1, 2, 'view', 0),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+            UserInteraction.objects.filter(user=self.users[user], product=self.products[product]).update(
+                timestamp=now - timedelta(days=age_days)
+            )
+        
+        with override_settings(RECOMMENDATION_TRAINING_WINDOW_DAYS=30, RECOMMENDATION_DECAY_HALF_LIFE_DAYS=2):
+            engine = RecommendationEngine()
+        model = engine.build_user_item_matrix()
+        
+        # the 40-day-old like is outside the window
+        self.assertEqual(model.user_item_matrix.shape, (2, 4))
+        self.assertAlmostEqual(model.user_row(0)[1], 5.0 * 2 ** -1.5, places=4)
+        self.assertAlmostEqual(model.user_row(1)[1], 4.0 * 2 ** -0.5, places=4)
+        self.assertAlmostEqual(model.user_row(1)[2], 1.0, places=4)
+        
+        self.interact(self.users[2], self.products[3], 'like')
+        # products plus today's rows; older days come from the cache
+        with self.assertNumQueries(2):
+            model = engine.build_user_item_matrix()
+        self.assertEqual(model.user_item_matrix.shape, (3, 4))
+        
+        UserInteraction.objects.filter(user=self.users[0], product=self.products[1]).delete()
+        model = engine.build_user_item_matrix()
+        self.assertEqual(list(model.user_ids), [self.users[1].id, self.users[2].id])
+    
+    def test_popular_products_come_from_maintained_counters(self):
+        from shop.models import ProductPopularity
+        from shop.recommendation import RecommendationEngine
+        
+        for user, product, interaction_type in [
+            (0, 2, 'view'), (1, 2, 'view'), (2, 2, 'like'), (0, 1, 'view'), (1, 1, 'view'),
+            (0, 3, 'like'),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+        UserInteraction.objects.filter(user=self.users[0], product=self.products[3]).delete()
+        
+        self.assertEqual(ProductPopularity.objects.get(product=self.products[2]).count, 3)
+        self.assertEqual(ProductPopularity.objects.get(product=self.products[3]).count, 0)
+        self.assertEqual(popularity_store.top(2), [self.products[2].id, self.products[1].id])
+        self.products[1].stock = 0
+        self.products[1].save()
+        
+        engine = RecommendationEngine()
+        # the ranking is cached, so only the in-stock lookup and the top-up hit the DB
+        with self.assertNumQueries(2):
+            popular = engine._get_popular_products(2, exclude_ids=[self.products[0].id])
+        self.assertEqual(popular, [self.products[2], self.products[3]])
+        
+        # counts move in place, rankings wait for the TTL
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users + self.users:
+                self.interact(user, self.products[0], 'view')
+        self.assertEqual(popularity_store.top(1), [self.products[2].id])
+        self.assertEqual(popularity_store.top(1, category_id=self.category.id), [self.products[0].id])
+        with override_settings(POPULARITY_CACHE_TTL=-1):
+            self.assertEqual(popularity_store.top(1), [self.products[0].id])
+
+    def test_out_of_stock_products_are_masked_before_selection(self):
+        from shop.recommendation import recommendation_engine
+        
+        for user, product in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2), (2, 0)]:
+            self.interact(self.users[user], self.products[product], 'like')
+        model = recommendation_engine.train()
+        self.products[1].stock = 0
+        self.products[1].save()
+        self.assertFalse(model.eligible[model.product_index[self.products[1].id]])
+        
+        with self.assertNumQueries(2):
+            recommended = recommendation_engine.get_recommendations(self.users[2], n_recommendations=1)
+        self.assertEqual(recommended, [self.products[2]])
+        batch = recommendation_engine.recommend_batch([model.user_index[self.users[2].id]], 2)
+        self.assertEqual(batch[0][0], self.products[2].id)
+        self.assertNotIn(self.products[1].id, batch[0])
+        similar = recommendation_engine.get_similar_products(self.products[0], n_similar=3)
+        self.assertNotIn(self.products[1], similar)
+
+    def test_recommendation_results_are_cached_per_model_version(self):
+        from shop.recommendation import RecommendationEngine
+        
+        for user, product in [(0, 0), (0, 1), (1, 0), (1, 2), (2, 0)]:
+            self.interact(self.users[user], self.products[product], 'like')
+        engine = RecommendationEngine()
+        model = engine.train()
+        first = engine.get_recommendations(self.users[2], n_recommendations=2)
+        # a cache hit skips scoring and only loads the cached products
+        with self.assertNumQueries(2):
+            self.assertEqual(engine.get_recommendations(self.users[2], n_recommendations=2), first)
+        similar = engine.get_similar_products(self.products[0], n_similar=2)
+        with self.assertNumQueries(1):
+            self.assertEqual(engine.get_similar_products(self.products[0], n_similar=2), similar)
+        
+        key = f'recommendations:{self.users[2].id}'
+        self.assertEqual(engine.result_cache.get(key)[0][0], model.version)
+        engine.apply_interaction(self.users[2].id, self.products[1].id, 4.0)
+        self.assertIsNone(engine.result_cache.get(key))
+        engine.get_recommendations(self.users[2], n_recommendations=2)
+        self.assertIsNotNone(engine.result_cache.get(key))
+        engine.train()
+        self.assertNotEqual(engine.result_cache.get(key)[0][0], engine.model.version)
+
+    def test_benchmark_command_reports_every_stage(self):
+        import json
+        from django.core.management import call_command
+        from shop.models import InteractionAggregate
+        
+        aggregates = InteractionAggregate.objects.count()
+        out = StringIO()
+        call_command('benchmark_recommendations', products=40, users=60, interactions=800,
+                     queries=5, repeat=1, json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        stages = results['results'][0]['stages']
+        self.assertEqual(set(stages), {
+            'read_interactions', 'build_user_item_matrix', 'compute_similarity_matrix', 'neighbor_index',
+            'predict_scores', 'get_recommendations', 'get_similar_products',
+        })
+        self.assertGreater(stages['neighbor_index']['peak_bytes'], 0)
+        self.assertEqual(stages['get_recommendations']['calls'], 5)
+        self.assertGreater(results['results'][0]['nnz'], 0)
+        self.assertEqual(Product.objects.count(), len(self.products))
+        self.assertEqual(User.objects.count(), len(self.users))
+        self.assertEqual(InteractionAggregate.objects.count(), aggregates)
+
+    def test_populate_data_generates_synthetic_history(self):
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from shop.models import ProductPopularity
+        
+        call_command('populate_data', users=20, products=30, categories=3, interactions=500, orders=40,
+                     seed=7, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 4 + 25 + 30)
+        self.assertEqual(UserInteraction.objects.count(), 500)
+        self.assertEqual(ProductPopularity.objects.aggregate(total=Sum('count'))['total'], 500)
+        self.assertEqual(Order.objects.count(), 40)
+        for order in Order.objects.prefetch_related('items')[:5]:
+            self.assertEqual(order.total_amount, sum(item.get_subtotal() for item in order.items.all()))
+
+    def test_metrics_endpoint_reports_engine_internals(self):
+        from shop.metrics import CACHE_REQUESTS, RESPONSES, TRAINS
+        from shop.recommendation import RecommendationEngine
+        
+        for user, product in [(0, 0), (0, 1), (1, 0), (1, 2)]:
+            self.interact(self.users[user], self.products[product], 'like')
+        engine = RecommendationEngine()
+        trains = TRAINS.value()
+        popular = RESPONSES.value(operation='recommendations', source='popular')
+        hits = CACHE_REQUESTS.value(operation='recommendations', result='hit')
+        engine.train()
+        engine.get_recommendations(self.users[2])
+        engine.get_recommendations(self.users[0])
+        engine.get_recommendations(self.users[0])
+        self.assertEqual(TRAINS.value(), trains + 1)
+        self.assertEqual(RESPONSES.value(operation='recommendations', source='popular'), popular + 1)
+        self.assertEqual(CACHE_REQUESTS.value(operation='recommendations', result='hit'), hits + 1)
+        
+        client = Client()
+        client.login(username='reader0', password='pass12345')
+        self.assertEqual(client.get(reverse('metrics')).status_code, 302)
+        self.users[0].is_staff = True
+        self.users[0].save()
+        response = client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE recommendation_train_stage_seconds histogram', body)
+        self.assertIn('recommendation_train_stage_seconds_bucket{stage="neighbors",le="+Inf"}', body)
+        self.assertIn('recommendation_model_shape{axis="products"} 4', body)
+
+    @override_settings(RECOMMENDATION_ALS_FACTORS=4, RECOMMENDATION_ALS_ITERATIONS=15)
+    def test_factorization_engine_matches_engine_api(self):
+        import tempfile
+        import numpy as np
+        from shop.factorization import FactorizationEngine, FactorizationModel
+        from shop.recommendation import create_engine
+        from shop.snapshots import load_snapshot, save_snapshot
+        
+        with override_settings(RECOMMENDATION_ENGINE='als'):
+            self.assertIsInstance(create_engine(), FactorizationEngine)
+        for user, product in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2), (2, 0)]:
+            self.interact(self.users[user], self.products[product], 'like')
+        engine = FactorizationEngine()
+        model = engine.train()
+        self.assertEqual(model.user_factors.shape, (3, 4))
+        self.assertEqual(model.item_factors.shape, (4, 4))
+        self.assertIsNone(model.neighbor_index)
+        
+        recommended = engine.get_recommendations(self.users[2], n_recommendations=2)
+        self.assertEqual({p.id for p in recommended}, {self.products[1].id, self.products[2].id})
+        similar = engine.get_similar_products(self.products[0], n_similar=2)
+        self.assertEqual({p.id for p in similar}, {self.products[1].id, self.products[2].id})
+        batch = engine.recommend_batch([model.user_index[self.users[2].id]], 2)
+        self.assertEqual(set(batch[0]), {self.products[1].id, self.products[2].id})
+        
+        user_idx = model.user_index[self.users[2].id]
+        before = model.predict_scores(user_idx, None)
+        self.assertTrue(engine.apply_interaction(self.users[2].id, self.products[1].id, 5.0))
+        self.assertGreater(model.predict_scores(user_idx, None)[1], before[1])
+        
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            save_snapshot(model, snapshot_dir)
+            loaded = load_snapshot(snapshot_dir)
+        self.assertIsInstance(loaded, FactorizationModel)
+        np.testing.assert_allclose(loaded.item_factors, model.item_factors)
+    
+    @override_settings(RECOMMENDATION_ENGINE='als', RECOMMENDATION_ALS_FACTORS=4)
+    def test_management_commands_use_the_configured_engine(self):
+        import tempfile
+        from unittest import mock
+        from django.core.management import call_command
+        from shop.factorization import FactorizationModel
+        from shop.models import UserRecommendation
+        from shop.recommendation import create_engine
+        from shop.snapshots import load_snapshot
+        
+        for user, product in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2), (2, 0)]:
+            self.interact(self.users[user], self.products[product], 'like')
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(RECOMMENDATION_SNAPSHOT_DIR=snapshot_dir):
+                call_command('train_recommendations', stdout=StringIO())
+                self.assertIsInstance(load_snapshot(snapshot_dir), FactorizationModel)
+                self.assertIsInstance(create_engine().refresh_from_snapshot(force=True), FactorizationModel)
+        
+        with mock.patch.object(FactorizationModel, 'predict_scores', autospec=True,
+                               side_effect=FactorizationModel.predict_scores) as predict_scores:
+            call_command('precompute_recommendations', top_n=2, stdout=StringIO())
+        self.assertTrue(predict_scores.called)
+        self.assertEqual(UserRecommendation.objects.count(), 3)
+
+    @override_settings(INTERACTION_LOG_MODE='buffered', INTERACTION_LOG_BATCH_SIZE=100)
+    def test_buffered_interaction_logger_flushes_in_bulk(self):
+        from unittest import mock
+        from shop.interaction_log import InteractionLogger
+        from shop.models import ProductPopularity
+        
+        interaction_logger = InteractionLogger()
+        with mock.patch.object(interaction_logger, '_ensure_started'):
+            for user in self.users:
+                interaction_logger.log(user.id, self.products[0].id, 'view')
+        self.assertEqual(interaction_logger.pending, 3)
+        self.assertFalse(UserInteraction.objects.exists())
+        
+        self.assertEqual(interaction_logger.flush(), 3)
+        self.assertEqual(interaction_logger.pending, 0)
+        self.assertEqual(UserInteraction.objects.filter(product=self.products[0]).count(), 3)
+        self.assertEqual(ProductPopularity.objects.get(product=self.products[0]).count, 3)
+        self.assertEqual(interaction_logger.flush(), 0)
+    
+    def test_like_toggles_update_a_single_aggregate_row(self):
+        import numpy as np
+        from shop.aggregation import rebuild
+        from shop.models import InteractionAggregate
+        from shop.recommendation import RecommendationEngine, recommendation_engine
+        
+        self.interact(self.users[0], self.products[0], 'view')
+        self.interact(self.users[1], self.products[1], 'purchase')
+        recommendation_engine.train()
+        self.addCleanup(setattr, recommendation_engine, 'model', None)
+        self.client.login(username='reader0', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            for view in ['like_product', 'like_product', 'dislike_product', 'like_product']:
+                self.client.post(reverse(view, args=[self.products[0].id]))
+        
+        aggregate = InteractionAggregate.objects.get(user=self.users[0], product=self.products[0])
+        self.assertEqual((aggregate.view_count, aggregate.like_count, aggregate.dislike_count), (1, 1, 0))
+        self.assertEqual(UserInteraction.objects.filter(user=self.users[0]).count(), 5)
+        live = recommendation_engine.model
+        rebuilt = RecommendationEngine().build_model()
+        user_idx = rebuilt.user_index[self.users[0].id]
+        np.testing.assert_allclose(live.user_row(live.user_index[self.users[0].id]), rebuilt.user_row(user_idx))
+        self.assertEqual(rebuilt.user_row(user_idx)[0], 5.0)
+        
+        InteractionAggregate.objects.update(view_count=0)
+        self.assertEqual(rebuild(), 2)
+        aggregate = InteractionAggregate.objects.get(user=self.users[0], product=self.products[0])
+        self.assertEqual((aggregate.view_count, aggregate.like_count, aggregate.dislike_count), (1, 1, 0))
+        # training reads one row per user and product pair
+        with self.assertNumQueries(2):
+            RecommendationEngine().build_user_item_matrix()
+    
+    def test_windowed_training_keeps_only_the_latest_like_or_dislike(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from shop.recommendation import RecommendationEngine
+        
+        now = timezone.now()
+        for user, product, interaction_type, age_days in [
+            (0, 0, 'like', 3), (0, 0, 'like', 2), (0, 0, 'dislike', 2), (0, 0, 'cart_add', 1),
+            (1, 0, 'dislike', 5), (1, 0, 'like', 4), (1, 1, 'like', 0),
+        ]:
+            interaction = UserInteraction.objects.create(
+                user=self.users[user], product=self.products[product], interaction_type=interaction_type
+            )
+            UserInteraction.objects.filter(pk=interaction.pk).update(timestamp=now - timedelta(days=age_days))
+        
+        with override_settings(RECOMMENDATION_TRAINING_WINDOW_DAYS=30):
+            engine = RecommendationEngine()
+        model = engine.build_user_item_matrix()
+        self.assertEqual(model.user_row(model.user_index[self.users[0].id])[0], 1.0)
+        self.assertEqual(model.user_row(model.user_index[self.users[1].id])[0], 4.0)
+        
+        # a toggle today supersedes events in the cached days
+        self.interact(self.users[0], self.products[0], 'like')
+        self.interact(self.users[1], self.products[1], 'dislike')
+        model = engine.build_user_item_matrix()
+        self.assertEqual(model.user_row(model.user_index[self.users[0].id])[0], 5.0)
+        self.assertEqual(list(model.user_row(model.user_index[self.users[1].id])[:2]), [4.0, 0.0])
+        unwindowed = RecommendationEngine().build_user_item_matrix()
+        for user in self.users[:2]:
+            self.assertEqual(
+                list(model.user_row(model.user_index[user.id])),
+                list(unwindowed.user_row(unwindowed.user_index[user.id]))
+            )
+    
+    def test_prune_interactions_archives_old_rows_and_keeps_aggregates(self):
+        import gzip
+        import json
+        import os
+        import shutil
+        import tempfile
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.management import call_command
+        from django.db import DatabaseError
+        from django.utils import timezone
+        from shop.models import InteractionAggregate, ProductPopularity
+        
+        for user, product, interaction_type, age in [
+            (0, 0, 'view', 400), (0, 0, 'like', 500), (1, 1, 'purchase', 420), (1, 2, 'view', 10),
+        ]:
+            self.interact(self.users[user], self.products[product], interaction_type)
+            UserInteraction.objects.filter(user=self.users[user], product=self.products[product]).update(
+                timestamp=timezone.now() - timedelta(days=age)
+            )
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        
+        out = StringIO()
+        call_command('prune_interactions', days=365, archive_dir=archive_dir, dry_run=True, stdout=out)
+        self.assertIn('3 of 4 interactions', out.getvalue())
+        self.assertEqual(UserInteraction.objects.count(), 4)
+        
+        # a run that stops after archiving a batch leaves rows that the retry archives again
+        with mock.patch('shop.retention._delete', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                call_command('prune_interactions', days=365, archive_dir=archive_dir, batch_size=2, stdout=StringIO())
+        self.assertEqual(UserInteraction.objects.count(), 4)
+        call_command('prune_interactions', days=365, archive_dir=archive_dir, batch_size=1, stdout=StringIO())
+        self.assertEqual(list(UserInteraction.objects.values_list('interaction_type', flat=True)), ['view'])
+        archived = []
+        for name in sorted(os.listdir(archive_dir)):
+            with gzip.open(os.path.join(archive_dir, name), 'rt') as archive_file:
+                archived.extend(json.loads(line) for line in archive_file)
+        self.assertEqual(sorted(row['interaction_type'] for row in archived), ['like', 'purchase', 'view'])
+        self.assertEqual(len({row['id'] for row in archived}), 3)
+        self.assertEqual(InteractionAggregate.objects.get(user=self.users[0], product=self.products[0]).like_count, 1)
+        self.assertEqual(ProductPopularity.objects.get(product=self.products[1]).count, 1)
+        
+        # rebuilding from the raw log keeps the pruned counts, and new toggles fold over them
+        self.interact(self.users[0], self.products[0], 'dislike')
+        expected = sorted(InteractionAggregate.objects.values_list(
+            'user_id', 'product_id', 'view_count', 'like_count', 'dislike_count', 'purchase_count'
+        ))
+        self.assertIn((self.users[0].id, self.products[0].id, 1, 0, 1, 0), expected)
+        call_command('rebuild_interaction_aggregates', stdout=StringIO())
+        self.assertEqual(sorted(InteractionAggregate.objects.values_list(
+            'user_id', 'product_id', 'view_count', 'like_count', 'dislike_count', 'purchase_count'
+        )), expected)
+    
+    def test_prune_retry_discards_parts_of_uncommitted_batches(self):
+        import gzip
+        import os
+        import shutil
+        import tempfile
+        from datetime import timedelta
+        from unittest import mock
+        from django.db import DatabaseError
+        from django.utils import timezone
+        from shop.retention import prune, retention_cutoff
+        
+        middle = (timezone.now() - timedelta(days=430)).replace(day=15)
+        age = (timezone.now() - middle).days
+        for product, timestamp in [(0, middle), (1, middle - timedelta(days=2))]:
+            self.interact(self.users[0], self.products[product], 'view')
+            UserInteraction.objects.filter(product=self.products[product]).update(timestamp=timestamp)
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        
+        # the failed run archived only the older row, the retry's wider cutoff puts both rows in one part
+        with mock.patch('shop.retention._delete', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                list(prune(retention_cutoff(age + 1), archive_dir))
+        self.assertEqual(sum(prune(retention_cutoff(age - 1), archive_dir)), 2)
+        lines = []
+        for name in os.listdir(archive_dir):
+            with gzip.open(os.path.join(archive_dir, name), 'rt') as archive_file:
+                lines.extend(archive_file)
+        self.assertEqual(len(lines), 2)
+
+
+@override_settings(RECOMMENDATION_TRAINING_MODE='sync', INTERACTION_LOG_MODE='sync')
+class QueryBudgetTest(TestCase):
+    """Per-view query budgets that must not grow with the amount of data shown"""
+    
+    SIZES = [1, 5, 25]
+    BUDGETS = {
+        'home': 4,
+        'product_list': 4,
+        'product_detail': 7,
+        'cart': 4,
+        'checkout': 4,
+        'order_history': 5,
+        'order_detail': 5,
+    }
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from shop.recommendation import recommendation_engine
+        
+        cache.clear()
+        popularity_store.clear()
+        self.addCleanup(popularity_store.clear)
+        self.addCleanup(setattr, recommendation_engine, 'model', None)
+    
+    def populate(self, size):
+        user = User.objects.create_user(username=f'shopper{size}', password='pass12345')
+        categories = [Category.objects.create(name=f'Category {size}-{i}') for i in range(size)]
+        products = [
+            Product.objects.create(name=f'Product {size}-{i}', description='A product', price=Decimal('5.00'),
+                                   category=categories[i % size], stock=10)
+            for i in range(2 * size)
+        ]
+        cart = Cart.objects.create(user=user)
+        for product in products[:size]:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            UserInteraction.objects.create(user=user, product=product, interaction_type='cart_add')
+        orders = []
+        for i in range(size):
+            order = Order.objects.create(user=user, total_amount=Decimal('10.00'), shipping_address='1 Test Road')
+            for product in products[i:i + 2]:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            orders.append(order)
+        return user, products, orders
+    
+    def test_hot_views_stay_within_query_budget(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from shop.recommendation import recommendation_engine
+        
+        for size in self.SIZES:
+            user, products, orders = self.populate(size)
+            recommendation_engine.train()
+            self.client.force_login(user)
+            urls = {
+                'home': reverse('home'),
+                'product_list': reverse('product_list'),
+                'product_detail': reverse('product_detail', args=[products[0].id]),
+                'cart': reverse('cart'),
+                'checkout': reverse('checkout'),
+                'order_history': reverse('order_history'),
+                'order_detail': reverse('order_detail', args=[orders[0].id]),
+            }
+            for name, url in urls.items():
+                with self.subTest(view=name, size=size):
+                    # the first request warms per-process caches such as the popularity ranking
+                    self.client.get(url)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), self.BUDGETS[name],
+                                         '\n'.join(query['sql'] for query in queries.captured_queries))
+    
+    @override_settings(INTERACTION_LOG_MODE='buffered')
+    def test_checkout_query_count_does_not_grow_with_cart_size(self):
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from shop.interaction_log import interaction_logger
+        
+        counts = []
+        with mock.patch.object(interaction_logger, '_ensure_started'):
+            for size in self.SIZES:
+                user, products, _ = self.populate(size)
+                self.client.force_login(user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.post(reverse('checkout'), {'shipping_address': '1 Test Road'})
+                self.assertEqual(response.status_code, 302)
+                counts.append(len(queries))
+                self.assertEqual(Order.objects.filter(user=user).count(), size + 1)
+                self.assertEqual(sorted(Product.objects.filter(id__in=[p.id for p in products[:size]])
+                                        .values_list('stock', flat=True).distinct()), [9])
+            self.assertEqual(interaction_logger.flush(), sum(self.SIZES))
+        self.assertEqual(len(set(counts)), 1, counts)
+    
+    @override_settings(PRODUCT_LIST_PAGE_SIZE=4)
+    def test_product_list_walks_keyset_pages_with_filters(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        _, products, _ = self.populate(5)
+        products[3].stock = 0
+        products[3].save()
+        Product.objects.filter(id__in=[products[0].id, products[8].id]).update(price=Decimal('9.00'))
+        expected = list(Product.objects.filter(stock__gt=0, price__lte=Decimal('5.00')).order_by('-id')
+                        .values_list('id', flat=True))
+        
+        pages = []
+        query_counts = []
+        query = 'max_price=5'
+        while query:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('product_list') + '?' + query)
+            query_counts.append(len(queries))
+            pages.append([product.id for product in response.context['products']])
+            query = response.context['next_query']
+            self.assertTrue(not query or 'max_price=5' in query)
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [4, 3])
+        self.assertEqual(len(set(query_counts)), 1)
+        
+        response = self.client.get(reverse('product_list') + '?' + response.context['previous_query'])
+        self.assertEqual([product.id for product in response.context['products']], pages[0])
+        self.assertIsNone(response.context['previous_query'])
+    
+    def test_cart_totals_are_maintained_when_items_change(self):
+        user, products, _ = self.populate(3)
+        self.client.force_login(user)
+        cart = Cart.objects.get(user=user)
+        self.assertEqual((cart.item_count, cart.total), (3, Decimal('15.00')))
+        
+        self.client.post(reverse('add_to_cart', args=[products[0].id]))
+        item = cart.items.get(product=products[1])
+        self.client.post(reverse('update_cart_item', args=[item.id]), {'action': 'remove'})
+        products[2].price = Decimal('7.50')
+        products[2].save()
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total), (3, Decimal('17.50')))
+        self.assertEqual(cart.total, sum(item.subtotal for item in cart.get_items()))
+        
+        self.client.post(reverse('checkout'), {'shipping_address': '1 Test Road'})
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total), (0, Decimal('0.00')))
+
+
+@override_settings(RECOMMENDATION_TRAINING_MODE='sync', INTERACTION_LOG_MODE='sync')
+class CheckoutConcurrencyTest(TransactionTestCase):
+    """Concurrent checkouts must never sell more than the available stock"""
+    
+    def test_concurrent_checkouts_do_not_oversell(self):
+        import random
+        import threading
+        import time
+        from django.db import OperationalError, connection
+        from shop.checkout import CheckoutError, place_order
+        
+        category = Category.objects.create(name='Limited')
+        product = Product.objects.create(name='Limited edition', description='Rare', price=Decimal('50.00'),
+                                         category=category, stock=3)
+        carts = []
+        for i in range(8):
+            cart = Cart.objects.create(user=User.objects.create_user(username=f'buyer{i}', password='pass12345'))
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            carts.append(cart)
+        start = threading.Barrier(len(carts))
+        outcomes = []
+        
+        def buy(cart):
+            start.wait()
+            deadline = time.monotonic() + 30
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        place_order(cart, '1 Test Road')
+                        outcomes.append('ordered')
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting; the transaction rolled back
+                        time.sleep(random.uniform(0.001, 0.02))
+                    except CheckoutError:
+                        outcomes.append('sold out')
+                        return
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=buy, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(outcomes.count('ordered'), 3)
+        self.assertEqual(outcomes.count('sold out'), 5)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 3)
+    
+    def test_stock_sold_after_the_read_is_not_oversold(self):
+        from unittest import mock
+        from shop import checkout
+        
+        category = Category.objects.create(name='Limited')
+        product = Product.objects.create(name='Limited edition', description='Rare', price=Decimal('50.00'),
+                                         category=category, stock=3)
+        cart = Cart.objects.create(user=User.objects.create_user(username='late', password='pass12345'))
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        per_product = checkout._per_product
+        
+        def sell_out_first(quantities):
+            # a worker on a backend without row locks sells stock between the read and the update;
+            # the simulated sale shares this transaction, so it is rolled back with it
+            Product.objects.filter(id=product.id).update(stock=1)
+            return per_product(quantities)
+        
+        with mock.patch.object(checkout, '_per_product', side_effect=sell_out_first):
+            with self.assertRaisesMessage(checkout.CheckoutError, 'sold out'):
+                checkout.place_order(cart, '1 Test Road')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cart.items.count(), 1)
+
+
+class ProductSearchTest(TestCase):
+    """Full-text product search"""
+    
+    def setUp(self):
+        self.kitchen = Category.objects.create(name='Kitchen')
+        self.garden = Category.objects.create(name='Garden')
+        self.products = {
+            name: Product.objects.create(name=name, description=description, price=Decimal('10.00'),
+                                         category=category, stock=5)
+            for name, description, category in [
+                ('Chef knife', 'Forged steel blade for the kitchen', self.kitchen),
+                ('Steel kettle', 'Whistling stovetop kettle', self.kitchen),
+                ('Garden hose', 'Flexible hose with steel fittings', self.garden),
+                ('Café mug', 'Ceramic mug', self.kitchen),
+            ]
+        }
+    
+    def search(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product.name for product in response.context['products']]
+    
+    def test_search_ranks_prefix_matches_and_follows_catalog_changes(self):
+        # a name match outranks description matches
+        results = self.search('steel')
+        self.assertEqual(results[0], 'Steel kettle')
+        self.assertEqual(sorted(results[1:]), ['Chef knife', 'Garden hose'])
+        self.assertEqual(self.search('kett'), ['Steel kettle'])
+        self.assertEqual(self.search('cafe'), ['Café mug'])
+        self.assertEqual(self.search('garden steel'), ['Garden hose'])
+        self.assertEqual(self.search('"; DROP TABLE'), [])
+        # the cap keeps the best matches, not the newest ones
+        with override_settings(SEARCH_RANK_CANDIDATES=1):
+            self.assertEqual(self.search('steel'), ['Steel kettle'])
+            self.assertEqual(self.search('steel', page=2), [])
+        
+        self.kitchen.name = 'Cookware'
+        self.kitchen.save()
+        self.assertEqual(sorted(self.search('cookware')), ['Café mug', 'Chef knife', 'Steel kettle'])
+        self.products['Steel kettle'].stock = 0
+        self.products['Steel kettle'].save()
+        self.products['Garden hose'].name = 'Garden sprinkler'
+        self.products['Garden hose'].save()
+        self.products['Chef knife'].delete()
+        self.assertEqual(self.search('steel'), ['Garden sprinkler'])
+        self.assertEqual(self.search('hose'), ['Garden sprinkler'])
+    
+    @override_settings(PRODUCT_LIST_PAGE_SIZE=2)
+    def test_search_pages_and_rebuild_restores_the_index(self):
+        from django.core.management import call_command
+        from django.db import connection
+        
+        first = self.search('kitchen')
+        response = self.client.get(reverse('search'), {'q': 'kitchen'})
+        self.assertEqual(len(first), 2)
+        second = self.search('kitchen', page=2)
+        self.assertEqual(len(first + second), 3)
+        self.assertFalse(set(first) & set(second))
+        self.assertTrue(response.context['next_query'])
+        
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM shop_product_fts')
+        self.assertEqual(self.search('kitchen'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 4 products', out.getvalue())
+        self.assertEqual(self.search('kitchen'), first)
+
+
+@override_settings(RECOMMENDATION_TRAINING_MODE='sync', INTERACTION_LOG_MODE='sync')
+class FragmentCacheTest(TestCase):
+    """Cached catalog fragments versioned by the catalog generation"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.category = Category.objects.create(name='Lighting')
+        self.product = Product.objects.create(name='Desk lamp', description='Adjustable arm', price=Decimal('25.00'),
+                                              category=self.category, stock=3)
+    
+    def test_fragments_are_reused_until_the_catalog_changes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Desk lamp')
+        self.assertContains(response, f'?category={self.category.id}')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home'))
+        self.assertFalse([query for query in queries.captured_queries if 'shop_' in query['sql']])
+        
+        # queryset updates send no signals, so the cached HTML is still served
+        Product.objects.filter(pk=self.product.pk).update(name='Floor lamp')
+        self.assertContains(self.client.get(reverse('home')), 'Desk lamp')
+        self.assertContains(self.client.get(reverse('product_list')), 'Floor lamp')
+        
+        self.product.refresh_from_db()
+        self.product.stock = 2
+        self.product.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Floor lamp')
+        self.assertContains(response, 'In stock: 2')
+        self.category.name = 'Lamps'
+        self.category.save()
+        self.assertContains(self.client.get(reverse('home')), 'Lamps', count=2)
+        self.assertContains(self.client.get(reverse('product_list')), 'Lamps')
+    
+    def test_checkout_bumps_the_catalog_generation(self):
+        from shop.catalog import catalog_generation
+        
+        user = User.objects.create_user(username='buyer', password='pass12345')
+        self.client.force_login(user)
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        self.assertContains(self.client.get(reverse('home')), 'In stock: 3')
+        generation = catalog_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('checkout'), {'shipping_address': '1 Test Road'})
+        self.assertGreater(catalog_generation(), generation)
+        self.assertContains(self.client.get(reverse('home')), 'In stock: 2')
+
+
+class BackgroundTrainerTest(SimpleTestCase):
+    """Tests for the debounced background trainer"""
+    
+    @override_settings(RECOMMENDATION_TRAINING_MODE='background', RECOMMENDATION_MIN_RETRAIN_INTERVAL=0.2)
+    def test_dirty_marks_coalesce_into_few_retrains(self):
+        import threading
+        import time
+        from shop.trainer import BackgroundTrainer
+        
+        class SlowEngine:
+            def __init__(self):
+                self.calls = 0
+                self.done = threading.Event()
+            
+            def retrain(self):
+                self.calls += 1
+                time.sleep(0.05)
+                self.done.set()
+        
+        engine = SlowEngine()
+        trainer = BackgroundTrainer(engine)
+        for _ in range(50):
+            trainer.mark_dirty()
+        self.assertTrue(engine.done.wait(2))
+        time.sleep(0.5)
+        
+        # one retrain for the burst, at most one more for marks that raced it
+        self.assertLessEqual(engine.calls, 2)
+        self.assertFalse(trainer.is_dirty)
+
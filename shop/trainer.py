@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .recommendation import recommendation_engine
+logger = logging.getLogger(__name__)
+class BackgroundTrainer:
+    def __init__(self, engine):
+        self.engine = engine
+        self.last_trained = None
+        self._dirty = threading.Event()
+        self._wake = threading.Event()
+        self._events = queue.SimpleQueue()
+        self._applied_since_train = 0
+        self._lock = threading.Lock()
+        self._thread = None
+    @property
+    def mode(self):
+        return getattr(settings, 'RECOMMENDATION_TRAINING_MODE', 'background')
+    @property
+    def min_interval(self):
+        return getattr(settings, 'RECOMMENDATION_MIN_RETRAIN_INTERVAL', 30.0)
+    @property
+    def full_rebuild_interval(self):
+        return getattr(settings, 'RECOMMENDATION_FULL_REBUILD_INTERVAL', 3600.0)
+    @property
+    def is_dirty(self):
+        return self._dirty.is_set()
+    def mark_dirty(self):
+        if self.mode == 'sync':
+            self._train()
+            return
+        self._dirty.set()
+        self._wake.set()
+        self._ensure_started()
+    def record_interaction(self, user_id, product_id, weight):
+        if self.mode == 'sync':
+            if not self.engine.apply_interaction(user_id, product_id, weight):
+                self._train()
+            return
+        self._events.put((user_id, product_id, weight, time.time()))
+        self._wake.set()
+        self._ensure_started()
+    def _train(self):
+        self._dirty.clear()
+        self.engine.retrain()
+        self.last_trained = time.monotonic()
+        self._applied_since_train = 0
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='recommendation-trainer',
+                    daemon=True
+                )
+                self._thread.start()
+    def _apply_pending(self):
+        while True:
+            try:
+                user_id, product_id, weight, recorded_at = self._events.get_nowait()
+            except queue.Empty:
+                return
+            if self.engine.apply_interaction(user_id, product_id, weight, recorded_at=recorded_at):
+                self._applied_since_train += 1
+                if self.last_trained is None:
+                    self.last_trained = time.monotonic()
+            else:
+                self._dirty.set()
+    def _seconds_until_rebuild(self):
+        if self.last_trained is None:
+            return 0.0 if self.is_dirty else None
+        elapsed = time.monotonic() - self.last_trained
+        if self.is_dirty:
+            return max(self.min_interval - elapsed, 0.0)
+        if self._applied_since_train:
+            return max(self.full_rebuild_interval - elapsed, 0.0)
+        return None
+    def _run(self):
+        while True:
+            self._wake.wait(self._seconds_until_rebuild())
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self._apply_pending()
+                if self._seconds_until_rebuild() == 0.0:
+                    self._train()
+            except Exception:
+                logger.exception('Recommendation retrain failed')
+                self.last_trained = time.monotonic()
+                self._dirty.set()
+            finally:
+                close_old_connections()
+recommendation_trainer = BackgroundTrainer(recommendation_engine)
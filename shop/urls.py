@@ -3,6 +3,7 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.product_list, name='product_list'),
+    path('search/', views.search, name='search'),
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
     path('cart/', views.cart, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
@@ -13,4 +14,5 @@ urlpatterns = [
     path('product/<int:product_id>/like/', views.like_product, name='like_product'),
     path('product/<int:product_id>/dislike/', views.dislike_product, name='dislike_product'),
     path('register/', views.register, name='register'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,15 +1,24 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.http import urlencode
 from decimal import Decimal
-from .models import Product, Category, Cart, CartItem, Order, OrderItem, UserInteraction
+from .models import Product, Category, Cart, CartItem, Order
+from .checkout import CheckoutError, place_order
+from .forms import ProductFilterForm, SearchForm
+from .interaction_log import interaction_logger
+from .metrics import registry
+from .pagination import keyset_page
+from .search import search_product_ids
 from .recommendation import recommendation_engine
 def home(request):
     categories = Category.objects.all()
-    featured_products = Product.objects.filter(stock__gt=0)[:8]
+    featured_products = Product.objects.filter(stock__gt=0).select_related('category')[:8]
     recommended_products = []
     if request.user.is_authenticated:
         recommended_products = recommendation_engine.get_recommendations(
@@ -23,19 +32,48 @@ def home(request):
     }
     return render(request, 'shop/home.html', context)
 def product_list(request):
-    products = Product.objects.filter(stock__gt=0)
+    form = ProductFilterForm(request.GET)
+    form.is_valid()
+    products = form.filter(
+        Product.objects.filter(stock__gt=0).select_related('category').only(
+            'name', 'description', 'price', 'stock', 'category__name'
+        )
+    )
+    page = keyset_page(
+        products,
+        getattr(settings, 'PRODUCT_LIST_PAGE_SIZE', 24),
+        after=form.cleaned_data.get('after'),
+        before=form.cleaned_data.get('before')
+    )
     context = {
-        'products': products,
+        'products': page['items'],
+        'categories': Category.objects.order_by('name').only('name'),
+        'filters': form.cleaned_data,
+        'previous_query': page['previous'] and form.query_string(before=page['previous']),
+        'next_query': page['next'] and form.query_string(after=page['next']),
     }
     return render(request, 'shop/product_list.html', context)
+def search(request):
+    form = SearchForm(request.GET)
+    form.is_valid()
+    query = (form.cleaned_data.get('q') or '').strip()
+    page = form.cleaned_data.get('page') or 1
+    size = getattr(settings, 'PRODUCT_LIST_PAGE_SIZE', 24)
+    product_ids = search_product_ids(query, size + 1, (page - 1) * size)
+    products = Product.objects.select_related('category').only(
+        'name', 'description', 'price', 'stock', 'category__name'
+    ).in_bulk(product_ids[:size])
+    context = {
+        'query': query,
+        'products': [products[product_id] for product_id in product_ids[:size] if product_id in products],
+        'previous_query': page > 1 and urlencode({'q': query, 'page': page - 1}),
+        'next_query': len(product_ids) > size and urlencode({'q': query, 'page': page + 1}),
+    }
+    return render(request, 'shop/search.html', context)
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
     if request.user.is_authenticated:
-        UserInteraction.objects.create(
-            user=request.user,
-            product=product,
-            interaction_type='view'
-        )
+        interaction_logger.log(request.user.id, product.id, 'view')
     similar_products = recommendation_engine.get_similar_products(product, n_similar=4)
     context = {
         'product': product,
@@ -61,17 +99,13 @@ def add_to_cart(request, product_id):
         else:
             messages.error(request, 'Cannot add more items than available in stock.')
             return redirect('product_detail', product_id=product_id)
-    UserInteraction.objects.create(
-        user=request.user,
-        product=product,
-        interaction_type='cart_add'
-    )
+    interaction_logger.log(request.user.id, product.id, 'cart_add')
     messages.success(request, f'{product.name} added to cart.')
     return redirect('cart')
 @login_required
 def cart(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
+    cart_items = cart.get_items()
     context = {
         'cart': cart,
         'cart_items': cart_items,
@@ -102,7 +136,7 @@ def update_cart_item(request, item_id):
 @login_required
 def checkout(request):
     cart = get_object_or_404(Cart, user=request.user)
-    cart_items = cart.items.all()
+    cart_items = cart.get_items()
     if not cart_items:
         messages.error(request, 'Your cart is empty.')
         return redirect('cart')
@@ -111,34 +145,11 @@ def checkout(request):
         if not shipping_address:
             messages.error(request, 'Please provide a shipping address.')
             return render(request, 'shop/checkout.html', {'cart': cart, 'cart_items': cart_items})
-        for item in cart_items:
-            if item.quantity > item.product.stock:
-                messages.error(request, f'Insufficient stock for {item.product.name}.')
-                return redirect('cart')
-        order = Order.objects.create(
-            user=request.user,
-            total_amount=cart.get_total(),
-            shipping_address=shipping_address
-        )
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price
-            )
-            UserInteraction.objects.create(
-                user=request.user,
-                product=item.product,
-                interaction_type='purchase'
-            )
-            item.product.stock -= item.quantity
-            item.product.save()
-        cart_items.delete()
         try:
-            recommendation_engine.train()
-        except:
-            pass
+            order = place_order(cart, shipping_address)
+        except CheckoutError as error:
+            messages.error(request, str(error))
+            return redirect('cart')
         messages.success(request, f'Order #{order.id} placed successfully!')
         return redirect('order_detail', order_id=order.id)
     context = {
@@ -148,14 +159,14 @@ def checkout(request):
     return render(request, 'shop/checkout.html', context)
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(Order.objects.prefetch_related('items__product'), id=order_id, user=request.user)
     context = {
         'order': order,
     }
     return render(request, 'shop/order_detail.html', context)
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user)
+    orders = Order.objects.filter(user=request.user).prefetch_related('items__product')
     context = {
         'orders': orders,
     }
@@ -163,40 +174,14 @@ def order_history(request):
 @login_required
 def like_product(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    UserInteraction.objects.filter(
-        user=request.user,
-        product=product,
-        interaction_type='dislike'
-    ).delete()
-    UserInteraction.objects.create(
-        user=request.user,
-        product=product,
-        interaction_type='like'
-    )
+    interaction_logger.log(request.user.id, product.id, 'like')
     messages.success(request, f'You liked {product.name}!')
-    try:
-        recommendation_engine.train()
-    except:
-        pass
     return redirect('product_detail', product_id=product_id)
 @login_required
 def dislike_product(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    UserInteraction.objects.filter(
-        user=request.user,
-        product=product,
-        interaction_type='like'
-    ).delete()
-    UserInteraction.objects.create(
-        user=request.user,
-        product=product,
-        interaction_type='dislike'
-    )
+    interaction_logger.log(request.user.id, product.id, 'dislike')
     messages.info(request, f'You disliked {product.name}. We\'ll show you less of this.')
-    try:
-        recommendation_engine.train()
-    except:
-        pass
     return redirect('home')
 def register(request):
     if request.user.is_authenticated:
@@ -210,4 +195,7 @@ def register(request):
             return redirect('home')
     else:
         form = UserCreationForm()
-    return render(request, 'registration/register.html', {'form': form})
\ No newline at end of file
+    return render(request, 'registration/register.html', {'form': form})
+@staff_member_required
+def metrics(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,145 @@
+import math
+import threading
+import time
+import weakref
+from array import array
+from datetime import datetime, timezone
+import numpy as np
+from .models import UserInteraction
+SECONDS_PER_DAY = 86400
+_caches = weakref.WeakSet()
+def _day_start(day):
+    return datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc)
+def invalidate_cached_day(timestamp):
+    for cache in list(_caches):
+        cache.invalidate(timestamp)
+class InteractionWindowCache:
+    def __init__(self, weights, exclusive=None):
+        self.weights = weights
+        exclusive = exclusive or {}
+        self.kinds = {interaction_type: kind for kind, interaction_type in enumerate(exclusive, 1)}
+        self.opposite = np.array([0] + [self.kinds[exclusive[interaction_type]] for interaction_type in exclusive])
+        self.days = {}
+        self.first_day = None
+        self.cached_until = None
+        self.decay_rate = None
+        self.invalid_days = set()
+        self._lock = threading.Lock()
+        _caches.add(self)
+    def reset(self):
+        with self._lock:
+            self.days = {}
+            self.cached_until = None
+            self.invalid_days = set()
+    def invalidate(self, timestamp):
+        day = int(timestamp.timestamp() // SECONDS_PER_DAY)
+        with self._lock:
+            self.days.pop(day, None)
+            if self.cached_until is not None and day < self.cached_until:
+                self.invalid_days.add(day)
+    def _fetch(self, first_day=None, last_day=None):
+        interactions = UserInteraction.objects.order_by()
+        if first_day is not None:
+            interactions = interactions.filter(timestamp__gte=_day_start(first_day))
+        if last_day is not None:
+            interactions = interactions.filter(timestamp__lt=_day_start(last_day))
+        user_col = array('q')
+        product_col = array('q')
+        weight_col = array('d')
+        time_col = array('d')
+        kind_col = array('b')
+        id_col = array('q')
+        rows = interactions.values_list('id', 'user_id', 'product_id', 'interaction_type', 'timestamp')
+        for interaction_id, user_id, product_id, interaction_type, timestamp in rows.iterator(chunk_size=10000):
+            user_col.append(user_id)
+            product_col.append(product_id)
+            weight_col.append(self.weights.get(interaction_type, 1.0))
+            time_col.append(timestamp.timestamp())
+            kind_col.append(self.kinds.get(interaction_type, 0))
+            id_col.append(interaction_id)
+        return (
+            np.frombuffer(user_col, dtype=np.int64),
+            np.frombuffer(product_col, dtype=np.int64),
+            np.frombuffer(weight_col, dtype=np.float64),
+            np.frombuffer(time_col, dtype=np.float64),
+            np.frombuffer(kind_col, dtype=np.int8),
+            np.frombuffer(id_col, dtype=np.int64),
+        )
+    def _aggregate_days(self, users, products, weights, timestamps, kinds, ids):
+        days = (timestamps // SECONDS_PER_DAY).astype(np.int64)
+        day_ends = (days + 1) * SECONDS_PER_DAY
+        decayed = weights * np.exp(-self.decay_rate * (day_ends - timestamps))
+        for day in np.unique(days).tolist():
+            in_day = days == day
+            plain = in_day & (kinds == 0)
+            toggles = in_day & (kinds != 0)
+            pairs, inverse = np.unique(
+                np.column_stack([users[plain], products[plain]]), axis=0, return_inverse=True
+            )
+            self.days[day] = (
+                pairs[:, 0].copy(),
+                pairs[:, 1].copy(),
+                np.bincount(inverse.ravel(), weights=decayed[plain], minlength=len(pairs)),
+                tuple(column[toggles] for column in (users, products, decayed, timestamps, kinds, ids)),
+            )
+    def _latest_toggles(self, users, products, weights, timestamps, kinds, ids):
+        # a like or dislike counts only if the user did not switch to the opposite one afterwards
+        order = np.lexsort((ids, timestamps, products, users))
+        users, products, kinds = users[order], products[order], kinds[order]
+        new_pair = np.ones(len(order), dtype=bool)
+        new_pair[1:] = (users[1:] != users[:-1]) | (products[1:] != products[:-1])
+        pair = np.cumsum(new_pair) - 1
+        position = np.arange(len(order))
+        last = np.full((len(self.opposite), pair[-1] + 1 if len(order) else 0), -1)
+        np.maximum.at(last, (kinds, pair), position)
+        latest = np.empty(len(order), dtype=bool)
+        latest[order] = position > last[self.opposite[kinds], pair]
+        return latest
+    def read(self, window_days=None, half_life_days=None, now=None):
+        now = time.time() if now is None else now
+        today = int(now // SECONDS_PER_DAY)
+        first_day = today - window_days if window_days else None
+        decay_rate = math.log(2) / (half_life_days * SECONDS_PER_DAY) if half_life_days else 0.0
+        with self._lock:
+            if decay_rate != self.decay_rate or (
+                self.first_day is not None and (first_day is None or first_day < self.first_day)
+            ):
+                self.days = {}
+                self.cached_until = None
+                self.invalid_days = set()
+            self.first_day = first_day
+            self.decay_rate = decay_rate
+            if first_day is not None:
+                for day in [day for day in self.days if day < first_day]:
+                    del self.days[day]
+            ranges = [(day, day + 1) for day in sorted(self.invalid_days)]
+            start = self.cached_until if self.cached_until is not None else first_day
+            if start is None or start < today:
+                ranges.append((start, today))
+            for range_start, range_end in ranges:
+                if first_day is not None and range_end <= first_day:
+                    continue
+                if range_start is not None and first_day is not None:
+                    range_start = max(range_start, first_day)
+                self._aggregate_days(*self._fetch(range_start, range_end))
+            self.invalid_days = set()
+            self.cached_until = today
+            cached = []
+            toggles = []
+            for day, (users, products, weights, (t_users, t_products, t_weights, *t_rest)) in self.days.items():
+                factor = math.exp(-decay_rate * (now - (day + 1) * SECONDS_PER_DAY))
+                cached.append((users, products, weights * factor))
+                toggles.append((t_users, t_products, t_weights * factor, *t_rest))
+        users, products, weights, timestamps, kinds, ids = self._fetch(today)
+        weights = weights * np.exp(-decay_rate * np.maximum(now - timestamps, 0))
+        plain = kinds == 0
+        cached.append((users[plain], products[plain], weights[plain]))
+        toggles.append(tuple(column[~plain] for column in (users, products, weights, timestamps, kinds, ids)))
+        toggles = [np.concatenate(columns) for columns in zip(*toggles)]
+        latest = self._latest_toggles(*toggles)
+        cached.append((toggles[0][latest], toggles[1][latest], toggles[2][latest]))
+        return (
+            np.concatenate([part[0] for part in cached]),
+            np.concatenate([part[1] for part in cached]),
+            np.concatenate([part[2] for part in cached]),
+        )